@@ -0,0 +1,125 @@
+'''
+Ambient light model learned from the greenhouse logs.
+The light readings logged while the LEDs are off are averaged over fixed
+time-of-day buckets, one day at a time, and each day is blended into the
+model with exponential decay (weight alpha for the newest day), so that the
+model follows the seasonal change in daylight.  Only complete days are used:
+readings from the day of the latest reading are held back until the model is
+next updated.  Rows that did not log the LED level (its column is blank in
+older logs) are not used, since their light may include the LEDs.
+A model is only saved once some bucket has been observed, and LightMonitor
+only uses it when it is usable (at least MIN_OBSERVED of its buckets have
+been observed); otherwise it falls back to grader_files/ambient.log.
+The model is stored as a single float64 .npy array: a header row
+(time of the last reading used, alpha, bucket size) followed by one row per
+bucket (bucket centre in seconds since midnight, light, days observed).
+Usage: python ambient_model.py [logdir or csvfile] [modelfile]
+'''
+import numpy as np
+import sys, os
+import logging_monitor, log_segments
+try:
+    from terrabot_utils import time_since_midnight
+except ImportError: # Running without ROS (see sim_hardware)
+    from sim_hardware import time_since_midnight
+
+MODEL_FILE = "ambient_model.npy"
+MIN_OBSERVED = 0.5 # Fraction of the buckets
+
+class AmbientModel:
+    def __init__(self, bucket_size=600, alpha=0.3):
+        self.bucket_size = bucket_size # seconds
+        self.alpha = alpha
+        self.last_time = 0.0
+        nbuckets = 86400//bucket_size
+        self.times = (np.arange(nbuckets) + 0.5)*bucket_size
+        self.values = np.zeros(nbuckets)
+        self.days = np.zeros(nbuckets)
+
+    @staticmethod
+    def load(filename=MODEL_FILE):
+        data = np.load(filename)
+        model = AmbientModel(int(data[0, 2]), data[0, 1])
+        model.last_time = data[0, 0]
+        model.times, model.values, model.days = (data[1:, 0].copy(),
+                                                 data[1:, 1].copy(),
+                                                 data[1:, 2].copy())
+        return model
+
+    def save(self, filename=MODEL_FILE):
+        header = [[self.last_time, self.alpha, self.bucket_size]]
+        rows = np.column_stack((self.times, self.values, self.days))
+        np.save(filename, np.vstack((header, rows)))
+
+    # Blend in the readings (arrays of unix times and light levels) taken
+    #  with the LEDs off since the last update
+    def update(self, times, lights):
+        new = times > self.last_time
+        times, lights = times[new], lights[new]
+        if (len(times) == 0): return 0
+        mtimes = np.array([time_since_midnight(t) for t in times])
+        midnights = np.round(times - mtimes)
+        complete = midnights < midnights.max()
+        nbuckets = len(self.times)
+        buckets = np.minimum(mtimes//self.bucket_size, nbuckets - 1).astype(int)
+        ndays = 0
+        for midnight in np.unique(midnights[complete]):
+            today = midnights == midnight
+            counts = np.bincount(buckets[today], minlength=nbuckets)
+            sums = np.bincount(buckets[today], lights[today], minlength=nbuckets)
+            seen = counts > 0
+            means = sums[seen]/counts[seen]
+            first = self.days[seen] == 0
+            self.values[seen] = np.where(first, means, (1 - self.alpha)*
+                                         self.values[seen] + self.alpha*means)
+            self.days[seen] += 1
+            self.last_time = times[today].max()
+            ndays += 1
+        return ndays
+
+    def observed(self):
+        return np.count_nonzero(self.days)
+
+    # Update the model from a greenhouse log (a CSV file, or a directory of
+    #  CSV segments), using only the rows logged with the LEDs off (rows
+    #  with no LED level, whose led is None, are skipped too)
+    def update_from_log(self, filename):
+        times, lights = [], []
+        if (os.path.isdir(filename)): log_lines = log_segments.lines(filename)
+        else: log_lines = open(filename)
+        for line in log_lines:
+            row = logging_monitor.parse_row(line)
+            if (row is not None and row["led"] == 0):
+                times.append(row["time"])
+                lights.append(row["light"])
+        return self.update(np.array(times), np.array(lights))
+
+    # The ambient light over the day, as an (N, 2) array of (seconds since
+    #  midnight, light), covering midnight to midnight.  Buckets that have
+    #  never been observed are left out (and so are interpolated over)
+    def profile(self):
+        seen = self.days > 0
+        times, values = self.times[seen], self.values[seen]
+        if (len(times) == 0): return np.zeros((0, 2))
+        return np.column_stack((np.concatenate(([0], times, [86400])),
+                                np.concatenate((values[:1], values, values[-1:]))))
+
+# Whether there is a model in filename with enough observed buckets to use
+def usable(filename=MODEL_FILE):
+    if (not os.path.exists(filename)): return False
+    model = AmbientModel.load(filename)
+    return model.observed() >= MIN_OBSERVED*len(model.days)
+
+if __name__ == '__main__':
+    logfile = sys.argv[1] if len(sys.argv) > 1 else log_segments.LOG_DIR
+    modelfile = sys.argv[2] if len(sys.argv) > 2 else MODEL_FILE
+    model = AmbientModel.load(modelfile) if os.path.exists(modelfile) else AmbientModel()
+    ndays = model.update_from_log(logfile)
+    print("Added %d day(s) from %s; %d of %d buckets observed"
+          %(ndays, logfile, model.observed(), len(model.days)))
+    if (model.observed() == 0):
+        print("No readings with the LEDs off (and logged); model not saved")
+    else:
+        model.save(modelfile)
+        print("Saved to %s%s" %(modelfile, "" if usable(modelfile) else
+                                " (too few buckets observed to be used yet)"))
@@ -0,0 +1,91 @@
+'''
+Shared, read-only ambient light profiles.
+load_profile(path) returns the ambient light over the day from either a text
+log of "time light" lines (such as grader_files/ambient.log) or a learned
+model (see ambient_model).  Profiles are cached for the whole process, keyed
+by path and modification time, so all the LightMonitors (and agents) in a
+process share a single copy.  The first time a text log is read, its
+(time, light) pairs are also written, as a float64 array, to a binary cache
+file next to it (.<name>.cache), which later processes memory-map instead of
+parsing the text.  The cache is replaced (not rewritten) when the log
+changes, so processes that have the old one mapped keep reading it.
+'''
+import numpy as np
+import os
+
+class AmbientProfile:
+    def __init__(self, data):
+        self.times = data[:, 0]
+        self.values = data[:, 1]
+        # Trapezoidal insolation from the start of the data up to each point,
+        #  so that any integral is just the difference of two cumulative values
+        cumulative = np.zeros(len(self.times))
+        if (len(self.times) > 1):
+            np.cumsum((self.values[1:] + self.values[:-1])/2.0*
+                      np.diff(self.times)/3600.0, out=cumulative[1:])
+        cumulative.flags.writeable = False
+        self.cumulative = cumulative
+
+    def __len__(self):
+        return len(self.times)
+
+    # Ambient insolation from the start of the data until time(s) t
+    def cumulative_at(self, t):
+        times, values = self.times, self.values
+        if (len(times) < 2): return np.zeros(np.shape(t))
+        index = np.clip(np.searchsorted(times, t, side='right') - 1, 0, len(times) - 2)
+        t = np.clip(t, times[0], times[-1])
+        t1, t2 = times[index], times[index+1]
+        v1, v2 = values[index], values[index+1]
+        v = v1 + (v2 - v1)*(t - t1)/np.where(t2 > t1, t2 - t1, 1)
+        return self.cumulative[index] + (v1 + v)/2.0*(t - t1)/3600.0
+
+    def integrate(self, ts, te):
+        if (te <= ts): return 0.0
+        return float(self.cumulative_at(te) - self.cumulative_at(ts))
+
+profiles = {} # Absolute path -> (mtime, AmbientProfile)
+
+def load_profile(path):
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    cached = profiles.get(path)
+    if (cached is None or cached[0] != mtime):
+        if (path.endswith(".npy")):
+            import ambient_model
+            data = ambient_model.AmbientModel.load(path).profile()
+            data.flags.writeable = False
+        else:
+            data = read_text_profile(path)
+        cached = (mtime, AmbientProfile(data))
+        profiles[path] = cached
+    return cached[1]
+
+def cacheFile(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, "." + name + ".cache")
+
+# The binary cache holds a header row (mtime and size of the text log)
+#  followed by the (time, light) rows
+def read_text_profile(path):
+    stat = os.stat(path)
+    cache = cacheFile(path)
+    try:
+        data = np.load(cache, mmap_mode='r')
+        if (data[0, 0] == stat.st_mtime and data[0, 1] == stat.st_size):
+            return data[1:]
+    except (OSError, ValueError, IndexError):
+        pass
+    data = np.loadtxt(path, ndmin=2)[:, :2]
+    # Other processes may have the old cache memory-mapped, so it is
+    #  replaced, never rewritten in place
+    tmpfile = "%s.%d.tmp" %(cache, os.getpid())
+    try:
+        with open(tmpfile, "wb") as f:
+            np.save(f, np.vstack(([[stat.st_mtime, stat.st_size]], data)))
+        os.replace(tmpfile, cache)
+    except OSError:
+        if (os.path.exists(tmpfile)): os.remove(tmpfile)
+        # Otherwise, just not cached
+    data.flags.writeable = False
+    return data
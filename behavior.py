@@ -7,14 +7,30 @@ Each behavior must implement:
      act - to take in the state and output actions for each actuator
      start - to start up after running
      pause - to shut down before stopping
+A behavior may also implement:
+     nextDeadline - the (unix) time by which it next needs to be stepped if
+       no sensor readings change; 0 means every step (the default), and None
+       means it only needs to run when some sensor reading changes
+A behavior may also declare:
+     inputs - the sensordata fields it depends on.  If set, the behavioral
+       layer skips stepping it when none of them has changed since its last
+       step, unless nextDeadline says it is due.  None (the default) means
+       it is stepped every time
 Each behavior performs one perceive, plan, act loop and returns the desired actions
 doStep sends commands to actuators
+Changes of FSM state (on start, pause and doStep) are recorded as events on
+the FSM logging channel (see log_channels)
 '''
-from std_msgs.msg import String
+import log_channels
+try:
+    from std_msgs.msg import String
+except ImportError: # Running without ROS (see sim_hardware)
+    String = None
 
 class Behavior(object):
     enablePub = None
     disablePub = None
+    inputs = None
 
     def __init__(self, agent, name):
         self.name = name
@@ -28,21 +44,39 @@ class Behavior(object):
     def setActuators(self, actuators):
         self.actuators = actuators
 
-    def start(self):
-        self.sensordata = self.sensors.doSense()
+    # sensordata is the reading shared by everything running this step;
+    #  if not given, the sensors are read
+    def start(self, sensordata=None):
+        self.sensordata = sensordata or self.sensors.doSense()
         self.perceive()
         print("Enable: %s" %self.name)
         # Let the world know this behavior has begun
         try: Behavior.enablePub.publish(String(data=self.name))
         except: pass
+        source = getattr(self, "state", None)
         self.enable()
+        self.logTransition("enable", source)
 
-    def pause(self):
+    # sensordata is the reading of the step in which the behavior is paused
+    #  (only used for the time of the FSM event); if not given, the
+    #  current time is used
+    def pause(self, sensordata=None):
         print("Disable: %s" %self.name)
         # Let the world know this behavior has stopped
         try: Behavior.disablePub.publish(String(data=self.name))
         except: pass
+        source = getattr(self, "state", None)
         self.disable()
+        self.logTransition("disable", source,
+                           sensordata.unix_time if sensordata else self.sensors.getTime())
+
+    # Record the change of state (if any) at time t, by default the time of
+    #  the reading the behavior last used
+    def logTransition(self, trigger, source, t=None):
+        dest = getattr(self, "state", None)
+        if (dest != source):
+            if (t is None): t = self.sensordata.unix_time
+            log_channels.fsm_event(t, self.name, trigger, source, dest)
 
     def perceive(self):
         pass
@@ -50,7 +84,12 @@ class Behavior(object):
     def act(self):
         pass
 
-    def doStep(self):
-        self.sensordata = self.sensors.doSense()
+    def nextDeadline(self):
+        return 0
+
+    def doStep(self, sensordata=None):
+        self.sensordata = sensordata or self.sensors.doSense()
+        source = getattr(self, "state", None)
         self.perceive()
         self.act()
+        self.logTransition("doStep", source)
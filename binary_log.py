@@ -0,0 +1,131 @@
+'''
+Compact binary telemetry log.
+Each row of the greenhouse log is stored as a fixed-width record: the time
+as a float64, the sensor readings as float32, the LED level as a byte and
+the fan, pump and camera as bits of another byte (34 bytes, instead of
+around 90 for a CSV row).  Another bit of that byte marks an LED level
+that was not logged (a blank led column in older CSV logs), which is read
+back as None.  Only whether the camera was commanded is kept, not the
+image name.  Records are appended to *.ghlog segments in a log directory
+(see log_segments).  Each segment starts with a header (a magic line and a
+JSON line with the record schema, padded to a multiple of HEADER_SIZE
+bytes).  Segments are read back as NumPy arrays, by memory-mapping the
+records (or, once a segment has been compressed, decompressing it), so
+long logs can be analyzed without parsing any text.
+Usage: python binary_log.py [directory]           - summarize a log
+       python binary_log.py -c csvfile [directory] - convert a CSV log
+'''
+import numpy as np
+import sys, os, json, gzip
+import log_segments
+
+MAGIC = b"GHLOG 1\n"
+HEADER_SIZE = 512
+DTYPE = np.dtype([("time", "<f8"), ("light", "<f4"), ("temp", "<f4"),
+                  ("humid", "<f4"), ("smoist", "<f4"), ("weight", "<f4"),
+                  ("level", "<f4"), ("led", "u1"), ("actuators", "u1")])
+# Bits of the actuators field
+ACTUATOR_BITS = {"fan": 1, "wpump": 2, "camera": 4}
+LED_NOT_LOGGED = 8 # The led field holds no value
+SENSORS = ["light", "temp", "humid", "smoist", "weight", "level"]
+LOG_DIR = log_segments.LOG_DIR
+EXTENSION = "ghlog"
+
+# The header of a file of dtype records (also used for rollups), padded to
+#  a multiple of HEADER_SIZE bytes
+def header(dtype=DTYPE):
+    schema = {"fields": [[name, dtype.fields[name][0].str] for name in dtype.names],
+              "actuator_bits": ACTUATOR_BITS, "led_not_logged": LED_NOT_LOGGED}
+    text = MAGIC + json.dumps(schema, separators=(",", ":")).encode() + b"\n"
+    return text.ljust(-(-len(text)//HEADER_SIZE)*HEADER_SIZE, b" ")
+
+# The record dtype and the size of the header of a file
+def read_header(path):
+    with log_segments.open_segment(path) as f:
+        magic = f.readline()
+        schema = f.readline()
+    if (magic != MAGIC or not schema.endswith(b"\n")):
+        raise Exception("%s is not a binary greenhouse log" %path)
+    fields = json.loads(schema.decode())["fields"]
+    size = -(-(len(magic) + len(schema))//HEADER_SIZE)*HEADER_SIZE
+    return np.dtype([(name, dtype) for name, dtype in fields]), size
+
+# Convert a row of values, in the order of logging_monitor.columns, to a record
+def to_record(values):
+    time, sensors, (fan, wpump, camera, led) = values[0], values[1:7], values[7:]
+    sensors = [np.nan if value == "" else value for value in sensors]
+    bits = ((ACTUATOR_BITS["fan"] if fan else 0) |
+            (ACTUATOR_BITS["wpump"] if wpump else 0) |
+            (ACTUATOR_BITS["camera"] if camera else 0) |
+            (LED_NOT_LOGGED if led is None or led == "" else 0))
+    led = 0 if bits & LED_NOT_LOGGED else int(min(255, max(0, led)))
+    return tuple([time] + sensors + [led, bits])
+
+# A record, as the (time, bytes) that log_segments writes
+def encode(values):
+    return (values[0], np.array([to_record(values)], dtype=DTYPE).tobytes())
+
+def segmented_log(directory=LOG_DIR, **options):
+    return log_segments.SegmentedLog(directory, EXTENSION, header(), **options)
+
+# The records of a segment, as a read-only structured array.  A record that
+#  was only partly written (if the agent was killed) is ignored
+def read_segment(path):
+    dtype, offset = read_header(path)
+    if (path.endswith(".gz")):
+        with gzip.open(path, "rb") as f:
+            data = f.read()[offset:]
+        return np.frombuffer(data, dtype, len(data)//dtype.itemsize)
+    count = (os.path.getsize(path) - offset)//dtype.itemsize
+    if (count <= 0): return np.zeros(0, dtype)
+    return np.memmap(path, dtype, mode='r', offset=offset, shape=(count,))
+
+def segments(directory=LOG_DIR):
+    return log_segments.segments(directory, EXTENSION)
+
+# All the records in a log directory, as a dictionary of column arrays
+#  (the actuator bits unpacked into boolean arrays, and the LED levels as
+#  floats, NaN where not logged)
+def read_log(directory=LOG_DIR):
+    records = [read_segment(path) for path in segments(directory)]
+    records = np.concatenate(records) if records else np.zeros(0, DTYPE)
+    data = {name: np.asarray(records[name])
+            for name in DTYPE.names if name != "actuators"}
+    for actuator, bit in ACTUATOR_BITS.items():
+        data[actuator] = (records["actuators"] & bit) != 0
+    data["led"] = np.where((records["actuators"] & LED_NOT_LOGGED) != 0, np.nan,
+                           records["led"])
+    return data
+
+def convert_csv(csvfile, directory=LOG_DIR):
+    import logging_monitor
+    records = []
+    with open(csvfile) as f:
+        for line in f:
+            row = logging_monitor.parse_row(line)
+            if (row is not None):
+                records.append(encode([row[name] for name in logging_monitor.columns]))
+    log = segmented_log(directory)
+    log.write(records)
+    log.close()
+    return len(records)
+
+if __name__ == '__main__':
+    if (len(sys.argv) > 2 and sys.argv[1] == "-c"):
+        directory = sys.argv[3] if len(sys.argv) > 3 else LOG_DIR
+        print("Converted %d rows of %s" %(convert_csv(sys.argv[2], directory),
+                                          sys.argv[2]))
+    else:
+        directory = sys.argv[1] if len(sys.argv) > 1 else LOG_DIR
+        data = read_log(directory)
+        print("%d records in %d segment(s)" %(len(data["time"]), len(segments(directory))))
+        if (len(data["time"]) > 0):
+            print("From %.1f to %.1f" %(data["time"][0], data["time"][-1]))
+            for name in SENSORS:
+                print("  %-7s min %8.1f  mean %8.1f  max %8.1f"
+                      %(name, np.nanmin(data[name]), np.nanmean(data[name]),
+                        np.nanmax(data[name])))
+            for name in ["fan", "wpump", "led"]:
+                logged = data[name][~np.isnan(data[name])] if name == "led" else data[name]
+                if (len(logged) == 0): print("  %-7s not logged" %name)
+                else: print("  %-7s on %5.1f%%" %(name, 100*np.mean(logged > 0)))
@@ -1,7 +1,8 @@
 from behavior import *
 from greenhouse_behaviors import Greenhouse_Behavior
-from transitions import Machine
+from fsm import Machine
 import os, os.path as op
+from log_channels import debug as debug_log
 
 class TakeImage(Greenhouse_Behavior):
     '''
@@ -82,10 +83,12 @@ class TakeImage(Greenhouse_Behavior):
         Uses midnight_time reset detection.
         """
         if self.last_image_day != self.current_day:
-            print(f"[DEBUG] New day detected! Resetting counter. (prev_day={self.last_image_day}, current_day={self.current_day})")
+            debug_log.debug("New day detected! Resetting counter. (prev_day=%s, current_day=%s)",
+                            self.last_image_day, self.current_day)
             self.today_images = 0
             self.last_image_day = self.current_day
-        print(f"[DEBUG] can_take_image check: today_images={self.today_images}, current_day={self.current_day}")
+        debug_log.debug("can_take_image check: today_images=%s, current_day=%s",
+                        self.today_images, self.current_day)
         return self.today_images < 3
         
         # current_midnight = self.sensordata['midnight_time']
@@ -131,25 +134,36 @@ class TakeImage(Greenhouse_Behavior):
     def retry_count_geq3(self):
         return self.retry_count >= 3
 
+    def nextDeadline(self):
+        if self.state == 'Halt':
+            return None
+        elif self.state == 'WaitLight':
+            return self.light_wait_start + 3
+        elif self.state == 'WaitImage':
+            return self.image_wait_start + 10
+        elif self.state == 'Retry':
+            return self.retry_wait_start + 20
+        return 0
+
     # Action Functions
     def increase_light(self):
         self.setLED(self.led + 40)
-        print(f"[DEBUG] Increasing LED to {self.led} (light={self.light})")
+        debug_log.debug("Increasing LED to %s (light=%s)", self.led, self.light)
 
     def decrease_light(self):
         self.setLED(self.led - 40)
-        print(f"[DEBUG] Decreasing LED to {self.led} (light={self.light})")
+        debug_log.debug("Decreasing LED to %s (light=%s)", self.led, self.light)
 
     def wait_light(self):
         self.light_wait_start = self.time
-        print(f"[DEBUG] Light stabilized. Waiting at time={self.time}")
+        debug_log.debug("Light stabilized. Waiting at time=%s", self.time)
 
     def request_image(self):
         """Send camera request and create output directory if needed."""
         dir_path = "/home/robotanist/TerraBot/images"
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
-            print(f"[DEBUG] Created image directory: {dir_path}")
+            debug_log.debug("Created image directory: %s", dir_path)
 
         filename = f"image_{int(self.time)}.jpg"
         self.image_path = os.path.join(dir_path, filename)
@@ -157,23 +171,23 @@ class TakeImage(Greenhouse_Behavior):
         self.actuators.doActions((self.name, self.sensors.getTime(),
                                   {"camera": self.image_path}))
         self.image_wait_start = self.time
-        print(f"[DEBUG] Requested image: {self.image_path} at time={self.time}")
+        debug_log.debug("Requested image: %s at time=%s", self.image_path, self.time)
 
     def update_today_images(self):
         self.today_images += 1
         self.retry_count = 0
-        print(f"[DEBUG] Image saved! today_images={self.today_images}")
+        debug_log.debug("Image saved! today_images=%s", self.today_images)
 
     def wait_for_retry(self):
         self.retry_wait_start = self.time
-        print(f"[DEBUG] Waiting 20s before retry #{self.retry_count + 1}")
+        debug_log.debug("Waiting 20s before retry #%s", self.retry_count + 1)
 
     def update_retry_count(self):
         self.retry_count += 1
-        print(f"[DEBUG] Retry count updated: {self.retry_count}")
+        debug_log.debug("Retry count updated: %s", self.retry_count)
 
     def reset(self):
-        print(f"[DEBUG] Resetting behavior. Final today_images={self.today_images}")
+        debug_log.debug("Resetting behavior. Final today_images=%s", self.today_images)
         self.image_path = None
         self.light_wait_start = None
         self.image_wait_start = None
@@ -197,6 +211,7 @@ class TakeImage(Greenhouse_Behavior):
         self.current_day = int(self.sensordata['unix_time'] // SECONDS_IN_A_DAY)
 
     def act(self):
-        print(f"[DEBUG] STATE={self.state}, time={self.time}, light={self.light}, "
-              f"today_images={self.today_images}, retry_count={self.retry_count}")
+        debug_log.debug("STATE=%s, time=%s, light=%s, today_images=%s, retry_count=%s",
+                        self.state, self.time, self.light, self.today_images,
+                        self.retry_count)
         self.trigger("doStep")
@@ -1,5 +1,5 @@
 from behavior import *
-from transitions import Machine
+from fsm import Machine
 from greenhouse_behaviors import Greenhouse_Behavior
 import send_email
 import os, os.path as op
@@ -255,3 +255,6 @@ class Email(Greenhouse_Behavior):
 
     def act(self):
         self.trigger("doStep")
+
+    def nextDeadline(self):
+        return None if self.state == "Halt" else 0
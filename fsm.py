@@ -0,0 +1,115 @@
+'''
+A lightweight, table-driven replacement for transitions.Machine, covering
+the part of its interface that the behaviors use:
+    fsm = Machine(model, states=[...], initial='Halt', ignore_invalid_triggers=True)
+    fsm.add_transition(trigger, source, dest, conditions=None, unless=None,
+                       before=None, after=None)
+    model.trigger(name); model.state
+Sources may be a state, a list of states or '*' (all the states); dest may
+be '=' (the source state).  Conditions, unless, before and after may be
+method names of the model, callables, or lists of either.  As with
+transitions, the transitions for a trigger are tried in the order they were
+added, and the first whose conditions all hold (and whose unless conditions
+all fail) is taken: its before callbacks run, the state changes, and its
+after callbacks run.  trigger returns whether a transition was taken.
+The transitions are compiled, on the first trigger after any are added,
+into a table from (trigger, state) to tuples of bound methods, so that a
+trigger is a dictionary lookup and a few calls.
+Usage: python fsm.py [triggers] - benchmark against transitions.Machine
+'''
+import sys, time
+
+class Machine:
+    def __init__(self, model, states, initial, ignore_invalid_triggers=False):
+        self.model = model
+        self.states = list(states)
+        if (initial not in self.states):
+            raise Exception("Initial state %s is not one of %s" %(initial, self.states))
+        self.ignore_invalid_triggers = ignore_invalid_triggers
+        self.transitions = [] # (trigger, source, dest, conditions, unless, before, after)
+        self.table = None     # (trigger, state) -> compiled transitions
+        model.state = initial
+        model.trigger = self.trigger
+
+    def add_transition(self, trigger, source, dest, conditions=None, unless=None,
+                       before=None, after=None):
+        if (source == '*'): sources = self.states
+        elif (isinstance(source, str)): sources = [source]
+        else: sources = source
+        for state in list(sources) + ([] if dest == '=' else [dest]):
+            if (state not in self.states):
+                raise Exception("Unknown state %s in transition %s" %(state, trigger))
+        for state in sources:
+            self.transitions.append((trigger, state, state if dest == '=' else dest,
+                                     conditions, unless, before, after))
+        self.table = None
+
+    def callbacks(self, names):
+        if (names is None): return ()
+        if (isinstance(names, str) or callable(names)): names = [names]
+        return tuple(getattr(self.model, name) if isinstance(name, str) else name
+                     for name in names)
+
+    def compile(self):
+        table = {}
+        for trigger, source, dest, conditions, unless, before, after in self.transitions:
+            table.setdefault((trigger, source), []).append(
+                (self.callbacks(conditions), self.callbacks(unless),
+                 self.callbacks(before), dest, self.callbacks(after)))
+        self.table = {key: tuple(entries) for key, entries in table.items()}
+
+    def trigger(self, trigger):
+        if (self.table is None): self.compile()
+        model = self.model
+        entries = self.table.get((trigger, model.state))
+        if (entries is None):
+            if (self.ignore_invalid_triggers): return False
+            raise Exception("Can't trigger %s from state %s" %(trigger, model.state))
+        for conditions, unless, before, dest, after in entries:
+            if (all(condition() for condition in conditions) and
+                not any(condition() for condition in unless)):
+                for callback in before: callback()
+                model.state = dest
+                for callback in after: callback()
+                return True
+        return False
+
+# A hysteresis FSM like the temperature behaviors, for the benchmark
+class BenchmarkModel:
+    def __init__(self, machine_class):
+        self.value = 0
+        self.count = 0
+        self.fsm = machine_class(self, states=['Halt', 'Init', 'Low', 'Perfect'],
+                                 initial='Halt', ignore_invalid_triggers=True)
+        self.fsm.add_transition('enable', 'Halt', 'Init', after='act')
+        self.fsm.add_transition('disable', '*', 'Halt', after='act')
+        self.fsm.add_transition('doStep', 'Init', 'Low', conditions='is_low', after='act')
+        self.fsm.add_transition('doStep', 'Init', 'Perfect', conditions='is_high')
+        self.fsm.add_transition('doStep', 'Low', 'Perfect', conditions='is_high', after='act')
+        self.fsm.add_transition('doStep', 'Perfect', 'Low', conditions='is_low', after='act')
+
+    def is_low(self): return self.value < 20
+    def is_high(self): return self.value >= 22
+    def act(self): self.count += 1
+
+def benchmark(machine_class, triggers):
+    start = time.perf_counter()
+    model = BenchmarkModel(machine_class)
+    setup = time.perf_counter() - start
+    model.trigger('enable')
+    start = time.perf_counter()
+    for i in range(triggers):
+        model.value = (i//50) % 25
+        model.trigger('doStep')
+    return setup, time.perf_counter() - start, model.count, model.state
+
+if __name__ == '__main__':
+    triggers = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    start = time.perf_counter()
+    import transitions
+    import_time = time.perf_counter() - start
+    for name, machine_class in (("fsm", Machine), ("transitions", transitions.Machine)):
+        setup, elapsed, count, state = benchmark(machine_class, triggers)
+        print("%-12s setup %7.3f ms, %d triggers in %.3f s (%.2f usec/trigger), %d actions, ends in %s"
+              %(name, 1000*setup, triggers, elapsed, 1e6*elapsed/triggers, count, state))
+    print("Importing transitions took %.1f ms" %(1000*import_time))
@@ -1,13 +1,27 @@
-import rclpy, rclpy.node
-import ros_hardware, layers
+import layers
 import sys, select
-from terrabot_utils import time_since_midnight, set_use_sim_time, spin_for, get_ros_time
-from terrabot_utils import clock_time
 import greenhouse_behaviors as gb
+import threshold_behaviors as tb
 import camera_behavior
-import email_behavior
 import light_monitor
 import logging_monitor
+import sim_hardware
+import replay_hardware, log_segments
+import profiler
+import log_channels
+try:
+    import rclpy, rclpy.node
+except ImportError:
+    # Without ROS, only the simulated hardware (-V) or a replay (-R) can be used
+    rclpy = None
+if rclpy is not None:
+    import ros_hardware
+    from terrabot_utils import set_use_sim_time, spin_for, get_ros_time
+    from terrabot_utils import clock_time
+    import email_behavior
+    Node = rclpy.node.Node
+else:
+    Node = object
 
 def check_for_input():
     if sys.stdin in select.select([sys.stdin],[],[],0)[0]:
@@ -17,12 +31,53 @@ def check_for_input():
         else:
             print("Usage: q (quit)")
 
-class GreenhouseAgent(rclpy.node.Node):
-    def __init__(self, agentName, use_sim):
-        super().__init__(agentName)
-        set_use_sim_time(self, use_sim)
-        # Wait for clock to start up correctly
-        while get_ros_time(self) == 0: spin_for(self, 0.1)
+class GreenhouseAgent(Node):
+    # If given a virtual_clock, the agent runs against the simulated
+    #  greenhouse in sim_hardware, without ROS; if given a
+    #  replay_hardware.ReplayClock, it replays a log instead
+    def __init__(self, agentName, use_sim, virtual_clock=None):
+        self.virtual_clock = virtual_clock
+        if virtual_clock is None:
+            super().__init__(agentName)
+            set_use_sim_time(self, use_sim)
+            # Wait for clock to start up correctly
+            while get_ros_time(self) == 0: spin_for(self, 0.1)
+        elif not self.is_replay():
+            self.greenhouse = sim_hardware.Greenhouse(virtual_clock)
+
+    def is_simulated(self):
+        return self.virtual_clock is not None
+
+    def is_replay(self):
+        return isinstance(self.virtual_clock, replay_hardware.ReplayClock)
+
+    # The ROS node that behaviors publish from (None when simulated)
+    def getNode(self):
+        return None if self.is_simulated() else self
+
+    def makeSensors(self):
+        if self.is_replay(): return replay_hardware.ReplaySensors(self.virtual_clock)
+        if self.is_simulated(): return sim_hardware.SimSensors(self.greenhouse)
+        return ros_hardware.ROSSensors(self)
+
+    def makeActuators(self, coalesce=False):
+        if self.is_replay():
+            return replay_hardware.ReplayActuators(self.virtual_clock, coalesce)
+        if self.is_simulated():
+            return sim_hardware.SimActuators(self.greenhouse, coalesce)
+        return ros_hardware.ROSActuators(self, coalesce)
+
+    def getTime(self):
+        if self.is_simulated(): return self.virtual_clock.now()
+        return get_ros_time(self)
+
+    def spin(self, duration):
+        if self.is_simulated(): self.virtual_clock.advance(duration)
+        else: spin_for(self, duration)
+
+    def ok(self):
+        if self.is_simulated(): return self.virtual_clock.running()
+        return rclpy.ok()
 
     # Often the agent starts running before sensor data is received
     # This waits for some data to have been received, assuming the real
@@ -30,22 +85,24 @@ class GreenhouseAgent(rclpy.node.Node):
     def wait_for_sensors(self, sensors):
         while sensors.weight == 0 or sensors.moisture == 0:
             #print("Wait")
-            spin_for(self, .25)
+            self.spin(.25)
 
 class BehavioralGreenhouseAgent(GreenhouseAgent):
 
-    def __init__(self, use_sim):
-        super().__init__("greenhouseagent_behavioral", use_sim)
+    def __init__(self, use_sim, virtual_clock=None, coalesce=False):
+        super().__init__("greenhouseagent_behavioral", use_sim, virtual_clock)
 
         # Initialize ROSSensors, ROSActuators, and behaviors,
         #  save each of them as instance variables, and pass them all
         #  to instantiate a BehavioralLayer
-        self.sensors = ros_hardware.ROSSensors(self)
+        self.sensors = self.makeSensors()
         # BEGIN STUDENT CODE
-        self.actuators = ros_hardware.ROSActuators(self)
-        self.behaviors = [gb.Light(self), gb.RaiseTemp(self), gb.LowerTemp(self),
-                          gb.LowerHumid(self), gb.RaiseSMoist(self), 
-                          gb.LowerSMoist(self)]
+        self.actuators = self.makeActuators(coalesce)
+        node = self.getNode()
+        # The threshold behaviors are evaluated together (threshold_behaviors)
+        raise_temp, lower_temp, lower_humid, lower_smoist = tb.makeBehaviors(node)
+        self.behaviors = [gb.Light(node), raise_temp, lower_temp,
+                          lower_humid, gb.RaiseSMoist(node), lower_smoist]
         self.setBehavioralLayer(layers.BehavioralLayer(self.sensors, self.actuators,
                                                        self.behaviors, self))
         # END STUDENT CODE
@@ -55,19 +112,30 @@ class BehavioralGreenhouseAgent(GreenhouseAgent):
     def getBehavioralLayer(self):
         return self.behavioral
 
+    def start(self):
+        self.getBehavioralLayer().startAll()
+
+    # Run a step of the behavioral architecture
+    def step(self, sensordata=None):
+        self.getBehavioralLayer().doStep(sensordata)
+
     def main(self):
         self.wait_for_sensors(self.sensors)
-        self.getBehavioralLayer().startAll()
-        while rclpy.ok():
-            # Run a step of the behavioral architecture
-            self.getBehavioralLayer().doStep()
-            spin_for(self, 1)
-            check_for_input()
+        self.start()
+        while self.ok():
+            self.step()
+            self.spin(1)
+            if not self.is_simulated(): check_for_input()
 
 class LayeredGreenhouseAgent(GreenhouseAgent):
 
-    def __init__(self, use_sim, schedulefile):
-        super().__init__("greenhouseagent_layered", use_sim)
+    def __init__(self, use_sim, schedulefile, event_driven=False,
+                 virtual_clock=None, coalesce=False, log_format="csv"):
+        super().__init__("greenhouseagent_layered", use_sim, virtual_clock)
+        # If event_driven, sleep until the next schedule change, monitor
+        #  period or behavior timer (or until a sensor reading changes),
+        #  rather than stepping every second
+        self.event_driven = event_driven
 
         # Initialize the architecture:
         # As with the behavioral agent, initialize ROSSensors, ROSActuators,
@@ -79,21 +147,33 @@ class LayeredGreenhouseAgent(GreenhouseAgent):
         #  connect the behavioral and planning layers to the executive, and
         #  the executive to the planning layer.
         # Don't forget to have the planning layer invoke getNewSchedule
-        self.sensors = ros_hardware.ROSSensors(self)
+        self.sensors = self.makeSensors()
         # BEGIN STUDENT CODE
-        self.actuators = ros_hardware.ROSActuators(self)
-        self.takeImage = camera_behavior.TakeImage(self)
-        self.emailer = email_behavior.Email(self)
-        self.behaviors = [gb.Light(self), gb.RaiseTemp(self), gb.LowerTemp(self),
-                          gb.LowerHumid(self), gb.RaiseSMoist(self),
-                          gb.LowerSMoist(self), self.takeImage, self.emailer]
+        self.actuators = self.makeActuators(coalesce)
+        node = self.getNode()
+        # The threshold behaviors are evaluated together (threshold_behaviors)
+        raise_temp, lower_temp, lower_humid, lower_smoist = tb.makeBehaviors(node)
+        self.behaviors = [gb.Light(node), raise_temp, lower_temp,
+                          lower_humid, gb.RaiseSMoist(node), lower_smoist]
+        # Taking and emailing images needs the real TerraBot
+        if not self.is_simulated():
+            self.takeImage = camera_behavior.TakeImage(node)
+            self.emailer = email_behavior.Email(node)
+            self.behaviors += [self.takeImage, self.emailer]
         self.setBehavioralLayer(layers.BehavioralLayer(self.sensors, self.actuators,
                                                        self.behaviors, self))
 
         self.setExecutiveLayer(layers.ExecutiveLayer(self))
         self.setPlanningLayer(layers.PlanningLayer(schedulefile, self))
+        if self.is_simulated():
+            self.getPlanningLayer().setUnavailableBehaviors(["TakeImageBehavior",
+                                                             "EmailBehavior"])
         self.getPlanningLayer().getNewSchedule()
-        self.getExecutiveLayer().setMonitors(self.sensors, self.actuators.actuator_state, [light_monitor.LightMonitor(), logging_monitor.LoggingMonitor()])
+        monitors = [light_monitor.LightMonitor()]
+        # A replayed run is not logged again
+        if not self.is_replay():
+            monitors.append(logging_monitor.LoggingMonitor(log_format=log_format))
+        self.getExecutiveLayer().setMonitors(self.sensors, self.actuators.actuator_state, monitors)
         # END STUDENT CODE
 
     def setBehavioralLayer(self, behavioral):
@@ -111,27 +191,108 @@ class LayeredGreenhouseAgent(GreenhouseAgent):
     def getPlanningLayer(self):
         return self.planning
 
+    # Earliest (unix) time at which any layer has something to do, but no
+    #  sooner than the usual one second step
+    def nextDeadline(self, now, t):
+        deadlines = [self.getPlanningLayer().nextDeadline(now, t),
+                     self.getExecutiveLayer().nextDeadline(now, t),
+                     self.getBehavioralLayer().nextDeadline()]
+        return max(now + 1, min(d for d in deadlines if d is not None))
+
+    # Spin until the deadline, or until a sensor reading changes
+    def spin_until(self, deadline):
+        self.sensors.changed = False
+        while self.ok() and not self.sensors.changed:
+            remaining = deadline - self.getTime()
+            if (remaining <= 0): break
+            if self.is_simulated(): self.virtual_clock.advance(min(remaining, 1))
+            else: rclpy.spin_once(self, timeout_sec=min(remaining, 1))
+
+    def start(self):
+        pass
+
+    # Run a step of each layer of the architecture.  Every layer sees the
+    #  same sensor readings this step, and if the actuators are coalescing,
+    #  the commands of behaviors started and paused by the executive are
+    #  sent together with those of the behaviors' steps
+    def step(self, sensordata=None):
+        if sensordata is None: sensordata = self.sensors.doSense()
+        t = sensordata.midnight_time
+        self.actuators.begin()
+        self.getPlanningLayer().doStep(t)
+        self.getExecutiveLayer().doStep(t, sensordata)
+        self.getBehavioralLayer().doStep(sensordata)
+        self.actuators.commit()
+
     def main(self):
         self.wait_for_sensors(self.sensors)
-        while rclpy.ok():
-            t = time_since_midnight(get_ros_time(self))
-            # Run a step of each layer of the architecture
-            self.getPlanningLayer().doStep(t)
-            self.getExecutiveLayer().doStep(t)
-            self.getBehavioralLayer().doStep()
-            spin_for(self, 1)
-            check_for_input()
+        while self.ok():
+            sensordata = self.sensors.doSense()
+            now = sensordata.unix_time
+            t = sensordata.midnight_time
+            self.step(sensordata)
+            if self.event_driven:
+                self.spin_until(self.nextDeadline(now, t))
+            else:
+                self.spin(1)
+            if not self.is_simulated(): check_for_input()
+
+# -V [days]: Run against the simulated greenhouse for that many days (default 7)
+def virtual_clock():
+    if not "-V" in sys.argv: return None
+    index = sys.argv.index("-V") + 1
+    days = 7
+    if index < len(sys.argv) and sys.argv[index].replace(".", "").isdigit():
+        days = float(sys.argv[index])
+    return sim_hardware.VirtualClock(duration=days*24*60*60)
+
+def is_number(arg):
+    return arg.replace(".", "", 1).isdigit()
+
+# -R [log] [step]: Replay a log (a CSV file or a log directory, by default
+#  greenhouse_log) rather than running the agent, also stepping the agent
+#  every step seconds between the logged rows, if given
+def replay_clock():
+    if not "-R" in sys.argv: return None
+    index = sys.argv.index("-R") + 1
+    source = log_segments.LOG_DIR
+    step = None
+    if (index < len(sys.argv) and not sys.argv[index].startswith("-")
+        and not is_number(sys.argv[index])):
+        source = sys.argv[index]
+        index += 1
+    if index < len(sys.argv) and is_number(sys.argv[index]):
+        step = float(sys.argv[index])
+    return (replay_hardware.ReplayClock(replay_hardware.read_rows(source)),
+            source, step)
 
 if __name__ == '__main__':
-    rclpy.init()
+    replaying = replay_clock()
+    clock = replaying[0] if replaying else virtual_clock()
+    if clock is None:
+        if rclpy is None:
+            sys.exit("ROS (rclpy) is not available: use the simulated greenhouse (-V) or replay a log (-R)")
+        rclpy.init()
+    # -D: Print the behaviors' debugging output
+    log_channels.setup(debug_on="-D" in sys.argv)
     sim = "-m" in sys.argv and "sim" in sys.argv
+    agent = None
     if "-B" in sys.argv:
         print("Starting Behavioral Agent")
-        agent = BehavioralGreenhouseAgent(sim)
-        agent.main()
+        agent = BehavioralGreenhouseAgent(sim, clock, "-C" in sys.argv)
     elif "-L" in sys.argv:
         print("Starting Layered Agent")
-        agent = LayeredGreenhouseAgent(sim, "greenhouse_schedule.txt")
-        agent.main()
+        agent = LayeredGreenhouseAgent(sim, "greenhouse_schedule.txt",
+                                       "-E" in sys.argv, clock,
+                                       "-C" in sys.argv,
+                                       # -F: Log in the binary format
+                                       "binary" if "-F" in sys.argv else "csv")
     else:
         print("Need to specify either behavioral (-B) or layered (-L) architecture")
+    if agent:
+        # -P: Profile the agent, writing the statistics to profile.json
+        # -PM: Also trace the memory allocated by each component (slower)
+        if "-P" in sys.argv or "-PM" in sys.argv:
+            profiler.Profiler(trace_memory="-PM" in sys.argv).instrument(agent)
+        if replaying: replay_hardware.report(agent, replaying[1], replaying[2])
+        else: agent.main()
@@ -1,6 +1,8 @@
 from behavior import *
 from limits import *
-from transitions import Machine
+from fsm import Machine
+from ring_buffer import RingBuffer
+from log_channels import debug as debug_log
 
 #sensor data passed into greenhouse behaviors:
 #  [time, lightlevel, temperature, humidity, soilmoisture, waterlevel]
@@ -55,6 +57,16 @@ class Light(Greenhouse_Behavior):
     def act(self):
         # Use 'doStep' trigger for all other transitions
         self.trigger("doStep")
+
+    def nextDeadline(self):
+        if (self.state == 'Halt'): return None
+        # Still adjusting the LEDs
+        if (self.state == 'Day' and (self.below_lower() or self.above_upper())):
+            return 0
+        # Otherwise, nothing to do until day starts or ends
+        for boundary in (8*3600, 22*3600, 32*3600):
+            if (self.mtime < boundary):
+                return self.time + boundary - self.mtime
         
     # Add all your condition functions here
     def is_day(self):
@@ -85,155 +97,11 @@ class Light(Greenhouse_Behavior):
                                   {"led": self.led}))
     def setOptimalLevel(self, level):
         self.optimal_level = (max(0,level-3), level+3)      
-        print(f"Optimal level updated to {self.optimal_level}")                                  
-
-"""
-The temperature should be greater than the lower limit
-"""
-class RaiseTemp(Greenhouse_Behavior):
-
-    def __init__(self, agent):
-        super(RaiseTemp, self).__init__(agent, "RaiseTempBehavior")
-
-        self.initial = 'Halt'
-        self.states = [self.initial, 'Init', 'Low', 'Perfect']
-        
-        self.fsm = Machine(self, states=self.states, initial=self.initial,
-                           ignore_invalid_triggers=True)
-        
-        self.fsm.add_transition('enable', 'Halt', 'Init', after='setInitial')
-        self.fsm.add_transition('disable', '*', 'Halt', after='ledOff')
-        self.fsm.add_transition('doStep', 'Init', 'Low', conditions='is_cold', after='setLED200')
-        self.fsm.add_transition('doStep', 'Init', 'Perfect', conditions='is_warm')
-        self.fsm.add_transition('doStep', 'Low', 'Perfect', conditions='is_warm', after='ledOff')
-        self.fsm.add_transition('doStep', 'Perfect', 'Low', conditions='is_cold', after='setLED200')
-
-    def setInitial(self):
-        self.setLED(0)
-        
-    def perceive(self):
-        self.temp = self.sensordata["temp"]
-
-    def act(self):
-        # Use 'doStep' trigger for all other transitions
-        self.trigger("doStep")
-
-    # Add all your condition functions here
-    def is_cold(self):
-        return self.temp <= limits['temperature'][0]
-    
-    def is_warm(self):
-        return self.temp >= optimal['temperature'][0]
-
-    # Add all your before / after action functions here
-    def setLED200(self):
-        self.setLED(200)
-    
-    def ledOff(self):
-        self.setLED(0)
-            
-    def setLED(self, level):
-        self.actuators.doActions((self.name, self.sensors.getTime(),
-                                  {"led": level}))
-        
-"""
-The temperature should be less than the upper limit
-"""
-class LowerTemp(Greenhouse_Behavior):
-
-    def __init__(self, agent):
-        super(LowerTemp, self).__init__(agent, "LowerTempBehavior")
-
-        self.initial = 'Halt'
-        self.states = [self.initial, 'Init', 'High', 'Perfect']
-
-        self.fsm = Machine(self, states=self.states, initial=self.initial,
-                           ignore_invalid_triggers=True)
-        
-        self.fsm.add_transition('enable', 'Halt', 'Init', after='setInitial')
-        self.fsm.add_transition('disable', '*', 'Halt', after='fanOff')
-        self.fsm.add_transition('doStep', 'Init', 'High', conditions='is_hot', after='fanOn')
-        self.fsm.add_transition('doStep', 'Init', 'Perfect', conditions='is_cool')
-        self.fsm.add_transition('doStep', 'High', 'Perfect', conditions='is_cool', after='fanOff')
-        self.fsm.add_transition('doStep', 'Perfect', 'High', conditions='is_hot', after='fanOn')
-
-    def setInitial(self):
-        self.setFan(False)
-        
-    def perceive(self):
-        self.temp = self.sensordata["temp"]
-
-    def act(self):
-        # Use 'doStep' trigger for all other transitions
-        self.trigger("doStep")
-
-    # Add all your condition functions here
-    def is_hot(self):
-        return self.temp >= limits['temperature'][1]
-    
-    def is_cool(self):
-        return self.temp <= optimal['temperature'][1]
-        
-    # Add all your before / after action functions here
-    def fanOn(self):
-        self.setFan(True)
-
-    def fanOff(self):
-        self.setFan(False)
-            
-    def setFan(self, act_state):
-        self.actuators.doActions((self.name, self.sensors.getTime(),
-                                  {"fan": act_state}))
-    
-"""
-Humidity should be less than the limit
-"""
-class LowerHumid(Greenhouse_Behavior):
-
-    def __init__(self, agent):
-        super(LowerHumid, self).__init__(agent, "LowerHumidBehavior")
-
-        self.initial = 'Halt'
-        self.states = [self.initial, 'Init', 'Humid', 'Perfect']
+        debug_log.debug("Optimal level updated to %s", self.optimal_level)                                  
 
-        self.fsm = Machine(self, states=self.states, initial=self.initial,
-                           ignore_invalid_triggers=True)
-
-        self.fsm.add_transition('enable', 'Halt', 'Init', after='setInitial')
-        self.fsm.add_transition('disable', '*', 'Halt', after='fanOff')
-        self.fsm.add_transition('doStep', 'Init', 'Humid', conditions='is_humid', after='fanOn')
-        self.fsm.add_transition('doStep', 'Init', 'Perfect', conditions='is_ok')
-        self.fsm.add_transition('doStep', 'Humid', 'Perfect', conditions='is_ok', after='fanOff')
-        self.fsm.add_transition('doStep', 'Perfect', 'Humid', conditions='is_humid', after='fanOn')
-        
-    def setInitial(self):
-        self.setFan(False)
-        
-    def perceive(self):
-        self.humid = self.sensordata["humid"]
+# The temperature, humidity and upper soil moisture limits are kept by
+#  threshold behaviors (see threshold_behaviors)
 
-    def act(self):
-        # Use 'doStep' trigger for all other transitions
-        self.trigger("doStep")
-
-    # Add all your condition functions here
-    def is_humid(self):
-        return self.humid >= limits['humidity'][1]
-    
-    def is_ok(self):
-        return self.humid <= optimal['humidity'][1]
-        
-    # Add all your before / after action functions here
-    def fanOn(self):
-        self.setFan(True)
-
-    def fanOff(self):
-        self.setFan(False)
-
-    def setFan(self, act_state):
-        self.actuators.doActions((self.name, self.sensors.getTime(),
-                                  {"fan": act_state}))
-            
 """
 Soil moisture should be greater than the lower limit
 """
@@ -242,8 +110,8 @@ class RaiseSMoist(Greenhouse_Behavior):
     def __init__(self, agent):
         super(RaiseSMoist, self).__init__(agent, "RaiseMoistBehavior")
         self.weight = 0
-        self.weight_window = []
-        self.smoist_window = []
+        self.weight_window = RingBuffer(4)
+        self.smoist_window = RingBuffer(4)
         self.total_water = 0
         self.water_level = 0
         self.start_weight = 0
@@ -277,24 +145,30 @@ class RaiseSMoist(Greenhouse_Behavior):
         self.setPump(False)
         self.setLastTime()
         
-    def sliding_window(self, window, item, length=4):
-        if (len(window) == length): window = window[1:]
-        window.append(item)
-        return window, sum(window)/float(len(window))
-    
     def perceive(self):
         self.time = self.sensordata["unix_time"]
         self.mtime = self.sensordata["midnight_time"]
         self.water_level = self.sensordata["level"]
         self.weight = self.sensordata["weight"]
-        self.weight_window, self.weight_est = self.sliding_window(self.weight_window, self.weight)
+        self.weight_window.append(self.weight)
+        self.weight_est = self.weight_window.mean()
         self.smoist = self.sensordata["smoist"]
-        self.smoist_window, self.smoist_est = self.sliding_window(self.smoist_window, self.smoist)
+        self.smoist_window.append(self.smoist)
+        self.smoist_est = self.smoist_window.mean()
 
     def act(self):
         # Use 'doStep' trigger for all other transitions
         self.trigger("doStep")
 
+    def nextDeadline(self):
+        if (self.state == 'Halt'): return None
+        elif (self.state == 'Init' and not self.is_next_day()):
+            return self.waittime
+        elif (self.state in ('Water', 'Measure')): return self.waittime
+        elif (self.state == 'Done'): # Wait until the next day
+            return self.time + 24*60*60 - self.mtime
+        return 0
+
     # Add all your condition functions here
     def is_next_day(self):
         return self.last_time > self.mtime
@@ -341,53 +215,3 @@ class RaiseSMoist(Greenhouse_Behavior):
 
     def waterAdded(self):
         self.total_water = self.total_water + max(0, self.weight_est-self.start_weight)
-
-
-"""
-Soil moisture below the upper limit
-"""
-class LowerSMoist(Greenhouse_Behavior):
-
-    def __init__(self, agent):
-        super(LowerSMoist, self).__init__(agent, "LowerMoistBehavior")
-
-        self.initial = 'Halt'
-        self.states = [self.initial, 'Init', 'Moist', 'Perfect']
-
-        self.fsm = Machine(self, states=self.states, initial=self.initial,
-                           ignore_invalid_triggers=True)
-
-        self.fsm.add_transition('enable', 'Halt', 'Init', after='setInitial')
-        self.fsm.add_transition('disable', '*', 'Halt', after='fanOff')
-        self.fsm.add_transition('doStep', 'Init', 'Moist', conditions='is_moist', after='fanOn')
-        self.fsm.add_transition('doStep', 'Init', 'Perfect', conditions='is_ok')
-        self.fsm.add_transition('doStep', 'Moist', 'Perfect', conditions='is_ok', after='fanOff')
-        self.fsm.add_transition('doStep', 'Perfect', 'Moist', conditions='is_moist', after='fanOn')
-        
-    def setInitial(self):
-        self.setFan(False)
-        
-    def perceive(self):
-        self.smoist = self.sensordata["smoist"]
-
-    def act(self):
-        # Use 'doStep' trigger for all other transitions
-        self.trigger("doStep")
-
-    # Add all your condition functions here
-    def is_moist(self):
-        return self.smoist >= limits['moisture'][1]
-    
-    def is_ok(self):
-        return self.smoist <= optimal['moisture'][1]
-        
-    # Add all your before / after action functions here
-    def fanOn(self):
-        self.setFan(True)
-
-    def fanOff(self):
-        self.setFan(False)
-
-    def setFan(self, act_state):
-        self.actuators.doActions((self.name, self.sensors.getTime(),
-                                  {"fan": act_state}))
@@ -1,3 +1,33 @@
+# One immutable reading of all the sensors, shared by every behavior and
+#  monitor that runs in the same step.  Fields can be read either as
+#  attributes or, like the dictionary doSense used to return, by key
+class SensorData(object):
+    __slots__ = ("unix_time", "midnight_time", "light", "temp", "humid",
+                 "weight", "smoist", "level", "light_raw", "temp_raw",
+                 "humid_raw", "weight_raw", "smoist_raw", "level_raw")
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, field, value):
+        raise AttributeError("SensorData is read-only")
+
+    def __getitem__(self, key):
+        try: return getattr(self, key)
+        except AttributeError: raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.__slots__]
+
+    def __repr__(self):
+        return "SensorData(%s)" %", ".join("%s=%s" %item for item in self.items())
 
 class Sensors:
 
@@ -6,7 +36,46 @@ class Sensors:
 
 
 class Actuators:
-
+    # When coalescing, actions are buffered between begin and commit, and
+    #  then at most one command is sent per actuator, skipping values that
+    #  have not changed.  Commands to the same actuator are merged: the fan
+    #  and pump are on if any behavior wants them on, and the LEDs are set to
+    #  the brightest level requested; otherwise the last command wins
+    merge_policy = {"fan": any, "wpump": any, "led": max}
+    coalesce = False
+    pending = None
+    sent = None
 
     def doActions(self, actions):
         pass
+
+    # Actually command the actuator
+    def send(self, actuator, value):
+        pass
+
+    def command(self, actuator, value):
+        if (self.pending is not None):
+            self.pending.setdefault(actuator, []).append(value)
+        else:
+            self.sendChanged(actuator, value)
+
+    def begin(self):
+        if (self.coalesce): self.pending = {}
+
+    # Whether actions are being buffered (between begin and commit)
+    def inTransaction(self):
+        return self.pending is not None
+
+    def commit(self):
+        pending, self.pending = self.pending, None
+        if (not pending): return
+        for actuator, values in pending.items():
+            merge = self.merge_policy.get(actuator)
+            self.sendChanged(actuator, merge(values) if merge else values[-1])
+
+    def sendChanged(self, actuator, value):
+        if (self.coalesce):
+            if (self.sent is None): self.sent = {}
+            if (actuator in self.sent and self.sent[actuator] == value): return
+            self.sent[actuator] = value
+        self.send(actuator, value)
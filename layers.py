@@ -1,4 +1,6 @@
 import schedule as sched
+from bisect import bisect_right
+import os, time
 
 class Layer:
     def __init__(self, agent):
@@ -11,10 +13,14 @@ class BehavioralLayer(Layer):
 
     def __init__(self, sensors, actuators, behaviors, agent):
         self.behaviors = behaviors
+        self.sensors = sensors
+        self.actuators = actuators
         for behavior in behaviors:
             behavior.setSensors(sensors)
             behavior.setActuators(actuators)
         self.enabled = []
+        self.last_inputs = {} # Behavior -> its inputs when last stepped
+        self.skipped = {}     # Behavior name -> number of steps skipped
         super(BehavioralLayer, self).__init__(agent)
         # Initialize any extra variables here
 
@@ -26,32 +32,62 @@ class BehavioralLayer(Layer):
     def isEnabled(self, behavior):
         return behavior in self.enabled
 
-    def startBehavior(self,name):
+    def startBehavior(self,name, sensordata=None):
         # BEGIN STUDENT CODE
         behavior = self.getBehavior(name)
         if behavior and not self.isEnabled(behavior):
-            behavior.start()
+            behavior.start(sensordata)
             self.enabled.append(behavior)
+            self.last_inputs.pop(behavior, None)
         # END STUDENT CODE
         pass
 
-    def pauseBehavior(self,name):
+    def pauseBehavior(self,name, sensordata=None):
         # BEGIN STUDENT CODE
         behavior = self.getBehavior(name)
         if behavior and self.isEnabled(behavior):
-            behavior.pause()
+            behavior.pause(sensordata)
             self.enabled.remove(behavior)
         # END STUDENT CODE
         pass
 
-    def doStep(self):
+    # All the behaviors see the same sensor readings, taken once per step
+    def doStep(self, sensordata=None):
+        if sensordata is None: sensordata = self.sensors.doSense()
+        # If the actuators are coalescing, send their commands together once
+        #  all the behaviors have stepped (unless the agent has begun a
+        #  transaction for its whole step)
+        own = not self.actuators.inTransaction()
+        if own: self.actuators.begin()
         for behavior in self.enabled:
-            behavior.doStep()
+            if (self.unchanged(behavior, sensordata)):
+                self.skipped[behavior.name] = self.skipped.get(behavior.name, 0) + 1
+            else:
+                behavior.doStep(sensordata)
+        if own: self.actuators.commit()
+
+    # A behavior that declares its inputs need not be stepped if none of
+    #  them has changed since its last step, and it has no timer due
+    def unchanged(self, behavior, sensordata):
+        if (behavior.inputs is None): return False
+        values = tuple([sensordata[field] for field in behavior.inputs])
+        if (self.last_inputs.get(behavior) == values):
+            deadline = behavior.nextDeadline()
+            if (deadline is None or deadline > sensordata.unix_time): return True
+        self.last_inputs[behavior] = values
+        return False
 
     def startAll(self):
         for behavior in self.behaviors:
             self.startBehavior(behavior.name)
 
+    # Earliest (unix) time at which an enabled behavior needs to be stepped,
+    #  even if no sensor readings change; None if none of them do
+    def nextDeadline(self):
+        deadlines = [behavior.nextDeadline() for behavior in self.enabled]
+        deadlines = [d for d in deadlines if d is not None]
+        return min(deadlines) if deadlines else None
+
     #more functions? write them here!
     # BEGIN SANITIZE ALL
     # END SANITIZE ALL
@@ -65,11 +101,23 @@ class ExecutiveLayer(Layer):
         super(ExecutiveLayer, self).__init__(agent)
         # Initialize any extra variables here
         # BEGIN SANITIZE ALL
-        self.enabledBehaviors = []
+        self.enabledBehaviors = ()
+        self.timeline = sched.scheduleTimeline(self.schedule)
+        self.segment = None
         # END SANITIZE ALL
 
-    def setSchedule(self, schedule):
+    # timeline is the compiled form of the schedule, if already available
+    def setSchedule(self, schedule, timeline=None):
         self.schedule = schedule
+        # BEGIN SANITIZE ALL
+        # Compile the schedule once, so doStep only has to find which
+        #  segment of the timeline it is in.  Forget the current segment so
+        #  the next step re-evaluates the (possibly changed) active behaviors
+        self.timeline = timeline or sched.scheduleTimeline(schedule)
+        self.segment = None
+        for monitor in self.monitors:
+            monitor.scheduleChanged()
+        # END SANITIZE ALL
 
     def requestNewSchedule(self):
         self.agent.getPlanningLayer().requestNewSchedule()
@@ -90,34 +138,41 @@ class ExecutiveLayer(Layer):
             monitor.dt = 0
             monitor.activate()
 
-    def doStep(self, t): #t time in seconds since midnight
+    def doStep(self, t, sensordata=None): #t time in seconds since midnight
         # NOTE: Disable any behaviors that need to be disabled
         #   before enabling any new behaviors
         # BEGIN STUDENT CODE
         currTimeInMins = t / 60
-        # First disable any behaviors that need to be disabled
-        for behavior, times in self.schedule.items():
-            if (behavior in self.enabledBehaviors):
-                stillEnabled = False
-                for startTime, endTime in times:
-                    if startTime <= currTimeInMins and currTimeInMins < endTime:
-                        stillEnabled = True
-                        break
-                if (not stillEnabled):
-                    self.enabledBehaviors.remove(behavior)
-                    self.agent.getBehavioralLayer().pauseBehavior(behavior)
-
-        # Now enable any behaviors
-        for behavior, times in self.schedule.items():
-            if (not behavior in self.enabledBehaviors):
-                for startTime, endTime in times:
-                    if startTime <= currTimeInMins and currTimeInMins < endTime:
-                        self.enabledBehaviors.append(behavior)
-                        self.agent.getBehavioralLayer().startBehavior(behavior)
-                        break
+        times, active = self.timeline
+        segment = bisect_right(times, currTimeInMins) - 1
+        # Nothing can start or stop until the next transition point
+        if (segment != self.segment):
+            self.segment = segment
+            nowActive = active[segment]
+            # First disable any behaviors that need to be disabled
+            for behavior in self.enabledBehaviors:
+                if (not behavior in nowActive):
+                    self.agent.getBehavioralLayer().pauseBehavior(behavior, sensordata)
+            # Now enable any behaviors
+            for behavior in nowActive:
+                if (not behavior in self.enabledBehaviors):
+                    self.agent.getBehavioralLayer().startBehavior(behavior, sensordata)
+            self.enabledBehaviors = nowActive
         # END STUDENT CODE
         for monitor in self.monitors:
-            monitor.doMonitor()
+            monitor.doMonitor(sensordata)
+
+    # Earliest (unix) time at which the schedule changes or a monitor is due.
+    #  now is the current unix time, t the corresponding seconds since midnight
+    def nextDeadline(self, now, t):
+        times, active = self.timeline
+        segment = bisect_right(times, t/60)
+        # After the last transition point, the next change is at midnight
+        nextMins = times[segment] if segment < len(times) else 24*60
+        deadline = now + (nextMins*60 - t)
+        for monitor in self.monitors:
+            deadline = min(deadline, monitor.last_time + monitor.period)
+        return deadline
 
 
 class PlanningLayer(Layer):
@@ -128,6 +183,11 @@ class PlanningLayer(Layer):
         self.schedulerequested = True
         self.schedule = {}
         self.laststep = 0
+        self.unavailable = []
+        # How often (wall clock seconds) to check if the schedule file changed
+        self.reload_period = 5
+        self.last_check = time.time()
+        self.schedulekey = None
         super(PlanningLayer, self).__init__(agent)
 
     def setTestingSchedule(self, testschedule):
@@ -137,26 +197,78 @@ class PlanningLayer(Layer):
         self.usetestfile = True
         self.requestNewSchedule()
 
+    def getScheduleFile(self):
+        return self.testschedule if self.usetestfile else self.schedulefile
+
     def getNewSchedule(self):
-        scheduleFile = self.testschedule if self.usetestfile else self.schedulefile
-        self.schedule = self.scheduleFromFile(scheduleFile)
-        self.agent.getExecutiveLayer().setSchedule(self.schedule)
+        scheduleFile = self.getScheduleFile()
+        self.schedulekey = self.fileKey(scheduleFile)
+        compiled = self.scheduleFromFile(scheduleFile)
+        # Schedules may differ by day of the week and date
+        schedule, timeline = compiled.daySchedule(self.agent.getTime())
+        changed = sched.diffSchedules(self.schedule, schedule)
+        if (self.schedule and changed):
+            print("Schedule changed for: %s" %", ".join(changed))
+        if (changed):
+            # Behaviors contending for the same actuator make it thrash
+            for line in sched.conflictReport(*sched.findConflicts(timeline)):
+                print("Schedule conflict: %s" %line)
+        self.schedule = schedule
+        # The executive starts or pauses only those behaviors whose status
+        #  at the current time has changed
+        self.agent.getExecutiveLayer().setSchedule(self.schedule, timeline)
         self.schedulerequested = False
 
+    # Reload the schedule, keeping the current one if the file is broken,
+    #  so that a bad edit cannot stop a running greenhouse
+    def reloadSchedule(self):
+        try:
+            self.getNewSchedule()
+        except Exception as e:
+            print("Keeping the current schedule: %s" %e)
+
+    def fileKey(self, scheduleFile):
+        try:
+            stat = os.stat(scheduleFile)
+            return (scheduleFile, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    # Poll the schedule file, at most every reload_period seconds
+    def scheduleFileChanged(self):
+        now = time.time()
+        if (now - self.last_check < self.reload_period): return False
+        self.last_check = now
+        key = self.fileKey(self.getScheduleFile())
+        if (key == self.schedulekey or key is None): return False
+        self.schedulekey = key
+        return True
+
+    # Behaviors that may be scheduled even though this agent does not have
+    #  them (such as ones that need hardware that is not available)
+    def setUnavailableBehaviors(self, names):
+        self.unavailable = list(names)
+
     def requestNewSchedule(self):
         self.schedulerequested = True
 
     def doStep(self, t):
-        if self.schedulerequested or self.checkEnded(t):
+        if self.schedulerequested:
             self.getNewSchedule()
+        elif self.checkEnded(t) or self.scheduleFileChanged():
+            self.reloadSchedule()
         self.laststep = (t//60)%(24*60)
 
+    def nextDeadline(self, now, t):
+        return now if self.schedulerequested else None
+
     def checkEnded(self, t):
         mins = (t//60)%(24*60)
         if mins < self.laststep: #looped back around
             return True
         return False
 
+    # Compiled schedules are cached, so rereading an unchanged file is cheap
     def scheduleFromFile(self, scheduleFile):
-        print(f"Reading schedule from {scheduleFile}")
-        return sched.readSchedule(scheduleFile)
+        names = [b.name for b in self.agent.getBehavioralLayer().behaviors]
+        return sched.loadSchedule(scheduleFile, names + self.unavailable)
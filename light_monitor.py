@@ -1,14 +1,24 @@
 from monitor import *
-from terrabot_utils import clock_time, time_since_midnight
+import numpy as np
+import ambient_profile, ambient_model
+from ring_buffer import RingBuffer
+try:
+    from terrabot_utils import clock_time, time_since_midnight
+except ImportError: # Running without ROS (see sim_hardware)
+    from sim_hardware import time_since_midnight
 
 class LightMonitor(Monitor):
-    ambient_data = []
+    ambient_data = None # An ambient_profile.AmbientProfile
     lighting_intervals = []
     insolation = 0 # Per hour
     target = 8500 # Default value
 
     def __init__(self, period=100):
         super(LightMonitor, self).__init__("LightMonitor", period)
+        # Recent light readings, to reject one-reading spikes (e.g., glare
+        #  on the sensor)
+        self.light_window = RingBuffer(5, reject=3, min_spread=100, max_rejects=1)
+        self.window_led = None # LED level of the readings in the window
         self.reset()
 
     def reset(self):
@@ -17,22 +27,57 @@ class LightMonitor(Monitor):
     def setTarget(self, target):
         self.target = target
 
+    # Either a text log of ambient light or a learned model (see
+    #  ambient_model).  The profiles are shared by all the monitors in the
+    #  process (see ambient_profile)
     def read_log_file(self, filename):
-        self.ambient_data = []
-        with open(filename) as log_file:
-            for line in log_file:
-                sline = line.split(" ")
-                time = float(sline[0])
-                data = float(sline[1].strip(' \n'))
-                self.ambient_data.append((time, data))
+        self.ambient_data = ambient_profile.load_profile(filename)
+
+    # Ambient insolation from the start of the ambient data until time t
+    def cumulative_ambient(self, t):
+        return float(self.ambient_data.cumulative_at(t))
 
     def activate(self):
-        self.read_log_file("grader_files/ambient.log")
+        # A learned model, if it has observed enough of the day
+        if (ambient_model.usable()):
+            self.read_log_file(ambient_model.MODEL_FILE)
+        else:
+            self.read_log_file("grader_files/ambient.log")
         self.lightBehavior = self.getExecutive().agent.getBehavioralLayer().getBehavior("LightBehavior")
+        self.scheduleChanged()
+        self.current_optimal = 900 # Arbitrary value - will be reset once the monitor begins
+
+    def scheduleChanged(self):
         schedule = self.getExecutive().schedule
         self.lighting_intervals = [(start*60, end*60)
-                                   for start, end in schedule['LightBehavior']]
-        self.current_optimal = 900 # Arbitrary value - will be reset once the monitor begins
+                                   for start, end in schedule.get('LightBehavior', [])]
+        self.build_tables()
+
+    # For each minute of the day, precompute the ambient insolation still to
+    #  come outside of the lighting intervals, and the lighting time still to
+    #  come (the tables have an extra entry for midnight at the end of the day)
+    def build_tables(self):
+        minutes = 24*60
+        lit = np.zeros(minutes, dtype=bool)
+        for start, end in self.lighting_intervals:
+            lit[int(start//60):min(minutes, int(end//60))] = True
+        ambient = np.diff(self.ambient_data.cumulative_at(np.arange(minutes+1)*60.0))
+        ambient[lit] = 0.0
+        lighting = np.where(lit, 60.0, 0.0)
+        # Suffix sums, from the end of the day back
+        self.ambient_remaining = np.append(np.cumsum(ambient[::-1])[::-1], 0.0).tolist()
+        self.lighting_remaining = np.append(np.cumsum(lighting[::-1])[::-1], 0.0).tolist()
+
+    # Look up (ambient insolation, lighting time) remaining after mtime,
+    #  interpolating within the minute.  Since the lighting intervals start
+    #  and end on the minute, this is exact for the lighting time, and very
+    #  nearly so for the ambient insolation
+    def remaining_light(self, mtime):
+        minute = min(int(mtime//60), 24*60 - 1)
+        fraction = (mtime - minute*60)/60.0
+        ambient, lighting = self.ambient_remaining, self.lighting_remaining
+        return (ambient[minute] + (ambient[minute+1] - ambient[minute])*fraction,
+                lighting[minute] + (lighting[minute+1] - lighting[minute])*fraction)
 
     def perceive(self):
         # BEGIN STUDENT CODE
@@ -55,10 +100,10 @@ class LightMonitor(Monitor):
 
             # BEGIN STUDENT CODE
             self.perceive()
+            self.light = self.filter_light(self.light)
             self.insolation += (self.light*self.dt)/3600.0
             end_of_day = self.time + (86400 - self.mtime)
-            ambient_remaining = self.non_lighting_ambient_insolation(self.mtime, 86400.0)
-            time_left = self.lighting_time_left(self.mtime)
+            ambient_remaining, time_left = self.remaining_light(self.mtime)
             to_target = self.target - self.insolation - ambient_remaining
 
             if time_left > 0 and to_target >0:
@@ -69,22 +114,20 @@ class LightMonitor(Monitor):
             # END STUDENT CODE
             
 
+    # The light reading, or the median of the recent readings if it is a
+    #  spike.  A jump when the LEDs have changed is not a spike, so then the
+    #  window starts over
+    def filter_light(self, light):
+        led = self.actuator_state["led"]
+        if (led != self.window_led):
+            self.light_window.clear()
+            self.window_led = led
+        if (self.light_window.append(light)): return light
+        return self.light_window.median()
+
     def integrate_ambient(self, ts, te):
-        ambient_insolation = 0
-        t1, v1 = self.ambient_data[0]
-        for index in range(1, len(self.ambient_data)):
-            t2, v2 = self.ambient_data[index]
-            if (ts < t2 and te > t1):
-                if (ts > t1): # Starts within an interval
-                    v1 = v1 + ((v2 - v1)*(ts - t1)/(t2 - t1))
-                    t1 = ts
-                if (te < t2): # Ends within an interval
-                    v2 = v1 + ((v2 - v1)*(te - t1)/(t2 - t1))
-                    t2 = te
-                mval = (v1 + v2)/2.0
-                ambient_insolation += mval*(t2 - t1)/3600.0
-            t1, v1 = self.ambient_data[index]
-        return ambient_insolation
+        if (te <= ts): return 0.0
+        return self.cumulative_ambient(te) - self.cumulative_ambient(ts)
 
     # Helper function:
     # How much ambient light will there be when LightBehavior is not running
@@ -0,0 +1,61 @@
+'''
+Named logging channels for the greenhouse agent, each with its own level
+and sink, so that no channel pays for another's volume:
+  greenhouse.telemetry - status of the telemetry logs themselves (the rows
+                         are written by LoggingMonitor, see log_segments),
+                         to telemetry_status.log
+  greenhouse.fsm       - behavior FSM state changes, one compact JSON event
+                         per line, to fsm_events.log
+  greenhouse.debug     - behavior debugging output, to the console (off
+                         unless debug is set)
+The chatter of the transitions library ("Executed callback ..."), if it
+is used at all, is dropped at the source.  setup is called by the agent's
+main program; if it is not called, the channels have no handlers and cost
+next to nothing.
+'''
+import logging, logging.handlers
+import json, sys
+
+telemetry = logging.getLogger("greenhouse.telemetry")
+fsm = logging.getLogger("greenhouse.fsm")
+debug = logging.getLogger("greenhouse.debug")
+
+class EventFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(getattr(record, "event", record.getMessage()),
+                          separators=(",", ":"))
+
+# Record a change of FSM state, at (unix) time t
+def fsm_event(t, behavior, trigger, source, dest):
+    if (fsm.isEnabledFor(logging.INFO)):
+        fsm.info("transition", extra={"event": {"t": t, "b": behavior, "e": trigger,
+                                                "from": source, "to": dest}})
+
+def stream_handler(stream, formatter):
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(formatter)
+    return handler
+
+def file_handler(filename, max_bytes, formatter):
+    handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes,
+                                                   backupCount=3)
+    handler.setFormatter(formatter)
+    return handler
+
+def setup(telemetry_file="telemetry_status.log", fsm_file="fsm_events.log",
+          debug_on=False, max_bytes=5*2**20):
+    logging.getLogger("transitions").setLevel(logging.WARNING)
+    channels = [(telemetry, logging.INFO,
+                 file_handler(telemetry_file, max_bytes,
+                              logging.Formatter("%(asctime)s %(levelname)s %(message)s"))),
+                (fsm, logging.INFO,
+                 file_handler(fsm_file, max_bytes, EventFormatter())),
+                (debug, logging.DEBUG if debug_on else logging.WARNING,
+                 stream_handler(sys.stdout, logging.Formatter("[%(levelname)s] %(message)s")))]
+    for logger, level, handler in channels:
+        for old in logger.handlers[:]:
+            logger.removeHandler(old)
+            old.close()
+        logger.setLevel(level)
+        logger.addHandler(handler)
+        logger.propagate = False
@@ -0,0 +1,104 @@
+'''
+Time range queries over the telemetry logs (see log_segments).
+query(start, end) streams, as a generator, the rows of a log directory
+logged between two (unix) times.  Only the segments that overlap the range
+are opened.  Within a CSV segment, reading starts from the last index entry
+at or before the start time (compressed segments are still decompressed
+from the start, but no rows are parsed until then); binary segments have
+fixed-width records, so the range is found by binary search.
+Usage: python log_query.py start end [directory]  - print the rows logged
+                                                    between start and end
+       python log_query.py -i [directory]         - index unindexed segments
+Times are either unix times or local times "YYYY-MM-DD HH:MM[:SS]".
+'''
+import numpy as np
+import sys, os, datetime
+import log_segments, logging_monitor, binary_log
+
+# The segments of a log directory that overlap [start, end]; each segment
+#  covers the time from its first record up to the next segment
+def overlapping(paths, start, end):
+    times = [log_segments.segment_time(path) for path in paths]
+    return [path for i, path in enumerate(paths)
+            if times[i] <= end and (i == len(paths) - 1 or times[i+1] > start)]
+
+def read_index(path):
+    try:
+        return np.fromfile(log_segments.index_path(path), "<f8").reshape(-1, 2)
+    except (OSError, ValueError):
+        return np.zeros((0, 2))
+
+def csv_rows(path, start, end):
+    index = read_index(path)
+    entry = np.searchsorted(index[:, 0], start, side='right') - 1
+    with log_segments.open_segment(path) as f:
+        if (entry >= 0): f.seek(int(index[entry, 1]))
+        for line in f:
+            row = logging_monitor.parse_row(line.decode(errors="replace"))
+            if (row is None or row["time"] < start): continue
+            if (row["time"] > end): break
+            yield row
+
+def binary_rows(path, start, end):
+    records = binary_log.read_segment(path)
+    first = np.searchsorted(records["time"], start, side='left')
+    last = np.searchsorted(records["time"], end, side='right')
+    for record in records[first:last]:
+        row = {name: float(record[name]) for name in binary_log.SENSORS}
+        row["time"] = float(record["time"])
+        for actuator, bit in binary_log.ACTUATOR_BITS.items():
+            row[actuator] = bool(record["actuators"] & bit)
+        if (record["actuators"] & binary_log.LED_NOT_LOGGED): row["led"] = None
+        else: row["led"] = int(record["led"])
+        yield row
+
+# Rows (dictionaries, keyed by logging_monitor.columns) logged between start
+#  and end, in order, from the CSV or the binary segments of the directory
+def query(start, end, directory=log_segments.LOG_DIR, log_format="csv"):
+    if (log_format == "binary"):
+        paths, rows = binary_log.segments(directory), binary_rows
+    else:
+        paths, rows = log_segments.segments(directory, "csv"), csv_rows
+    for path in overlapping(paths, start, end):
+        yield from rows(path, start, end)
+
+# Write the index of a segment logged without one
+def build_index(path, every=100):
+    entries = []
+    offset = 0
+    count = 0
+    with log_segments.open_segment(path) as f:
+        for line in f:
+            row = logging_monitor.parse_row(line.decode(errors="replace"))
+            if (row is not None):
+                if (count % every == 0): entries.append((row["time"], offset))
+                count += 1
+            offset += len(line)
+    np.array(entries, "<f8").tofile(log_segments.index_path(path))
+    return len(entries)
+
+def parse_time(text):
+    try:
+        return float(text)
+    except ValueError:
+        for format in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+            try: return datetime.datetime.strptime(text, format).timestamp()
+            except ValueError: pass
+    raise Exception("Cannot parse time %s" %text)
+
+if __name__ == '__main__':
+    if (len(sys.argv) > 1 and sys.argv[1] == "-i"):
+        directory = sys.argv[2] if len(sys.argv) > 2 else log_segments.LOG_DIR
+        for path in log_segments.segments(directory, "csv"):
+            if (not os.path.exists(log_segments.index_path(path))):
+                print("%s: %d index entries" %(path, build_index(path)))
+    elif (len(sys.argv) > 2):
+        directory = sys.argv[3] if len(sys.argv) > 3 else log_segments.LOG_DIR
+        print(logging_monitor.header)
+        log_format = "csv" if log_segments.segments(directory, "csv") else "binary"
+        for row in query(parse_time(sys.argv[1]), parse_time(sys.argv[2]),
+                         directory, log_format):
+            print(logging_monitor.format_row([row.get(name, "")
+                                              for name in logging_monitor.columns]))
+    else:
+        print("Usage: python log_query.py start end [directory] | -i [directory]")
@@ -0,0 +1,177 @@
+'''
+Time-partitioned, size-capped segments for the greenhouse logs.
+Records are appended to segment files in a log directory, named by the
+(unix) time of their first record.  A new segment is started at the start
+of each (simulated) day, whenever a segment reaches max_bytes, and each
+time the agent starts, so a restart never overwrites earlier data.  Each
+segment starts with the given header.  Closed segments (including any left
+over from earlier runs) are gzipped by a background thread.  Segments
+whose first record is more than retention_days older than the latest
+record are deleted, as are the oldest segments whenever all the segments
+together take more than max_total_bytes.
+If index_every is set, a sparse index is written next to each segment
+(<segment>.idx): the time and (uncompressed) byte offset of every
+index_every-th record, as pairs of float64s, so that a time range can be
+read without scanning the whole segment (see log_query).
+'''
+import os, glob, gzip, shutil, threading, queue, atexit, struct
+from log_channels import telemetry as telemetry_log
+try:
+    from terrabot_utils import time_since_midnight
+except ImportError: # Running without ROS (see sim_hardware)
+    from sim_hardware import time_since_midnight
+
+LOG_DIR = "greenhouse_log"
+
+class Compressor:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="LogCompressor",
+                                       daemon=True)
+        self.thread.start()
+
+    def compress(self, path):
+        self.queue.put(path)
+
+    def run(self):
+        while True:
+            path = self.queue.get()
+            if (path is None): break
+            try:
+                with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(path + ".gz.tmp", path + ".gz")
+                os.remove(path)
+            except FileNotFoundError:
+                pass # Already deleted (see SegmentedLog.enforceRetention)
+            except OSError as e:
+                telemetry_log.error("Failed to compress %s: %s", path, e)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+class SegmentedLog:
+    def __init__(self, directory=LOG_DIR, extension="csv", header=b"",
+                 max_bytes=10*2**20, retention_days=30, max_total_bytes=200*2**20,
+                 compress=True, index_every=0):
+        self.directory = directory
+        self.extension = extension
+        self.header = header
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self.compressor = Compressor() if compress else None
+        self.index_every = index_every
+        self.index = None # The index file of the current segment
+        self.count = 0    # Records in the current segment
+        self.file = None
+        self.path = None
+        self.midnight = None # Start of the day of the current segment
+        self.size = 0
+        self.closed = False
+        os.makedirs(directory, exist_ok=True)
+        # Segments left by earlier runs are closed
+        if (self.compressor):
+            for path in segments(directory, extension):
+                if (not path.endswith(".gz")): self.compressor.compress(path)
+        atexit.register(self.close)
+
+    # Append a list of (time, bytes) records
+    def write(self, records):
+        for t, data in records:
+            midnight = round(t - time_since_midnight(t))
+            if (self.file is None or midnight != self.midnight or
+                self.size + len(data) > self.max_bytes):
+                self.roll(t, midnight)
+            if (self.index and self.count % self.index_every == 0):
+                self.index.write(struct.pack("<dd", t, self.size))
+            self.file.write(data)
+            self.size += len(data)
+            self.count += 1
+        if (self.file): self.file.flush()
+        if (self.index): self.index.flush()
+
+    def roll(self, t, midnight):
+        self.closeSegment()
+        name = int(t)
+        while (os.path.exists(self.segmentPath(name)) or
+               os.path.exists(self.segmentPath(name) + ".gz")):
+            name += 1
+        self.path = self.segmentPath(name)
+        self.file = open(self.path, "wb")
+        self.file.write(self.header)
+        self.size = len(self.header)
+        self.count = 0
+        if (self.index_every): self.index = open(index_path(self.path), "wb")
+        self.midnight = midnight
+        telemetry_log.info("Started log segment %s", self.path)
+        self.enforceRetention(t)
+
+    def segmentPath(self, name):
+        return os.path.join(self.directory, "%d.%s" %(name, self.extension))
+
+    def closeSegment(self):
+        if (self.file is None): return
+        self.file.close()
+        self.file = None
+        if (self.index):
+            self.index.close()
+            self.index = None
+        if (self.compressor): self.compressor.compress(self.path)
+
+    def enforceRetention(self, now):
+        closed = [path for path in segments(self.directory, self.extension)
+                  if path != self.path]
+        for path in closed:
+            if (segment_time(path) < now - self.retention_days*86400):
+                telemetry_log.info("Removing expired log segment %s", path)
+                remove(path)
+        closed = [path for path in closed if os.path.exists(path)]
+        total = sum(size(path) for path in closed) + self.size
+        for path in closed:
+            if (total <= self.max_total_bytes): break
+            total -= size(path)
+            telemetry_log.info("Removing log segment %s (over %d bytes)",
+                               path, self.max_total_bytes)
+            remove(path)
+
+    def close(self):
+        if (self.closed): return
+        self.closed = True
+        self.closeSegment()
+        if (self.compressor): self.compressor.close()
+
+def size(path):
+    try: return os.path.getsize(path)
+    except OSError: return 0 # Just compressed
+
+# Remove a segment, and its index
+def remove(path):
+    for name in (path, index_path(path)):
+        try: os.remove(name)
+        except OSError: pass
+
+def index_path(path):
+    if (path.endswith(".gz")): path = path[:-len(".gz")]
+    return path + ".idx"
+
+def segment_time(path):
+    return int(os.path.basename(path).split(".")[0])
+
+# The segments of a log directory with the given extension (compressed or
+#  not), in order
+def segments(directory=LOG_DIR, extension="csv"):
+    paths = (glob.glob(os.path.join(directory, "*." + extension)) +
+             glob.glob(os.path.join(directory, "*.%s.gz" %extension)))
+    return sorted(paths, key=segment_time)
+
+def open_segment(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+# All the lines of the (text) segments of a log directory, in order
+def lines(directory=LOG_DIR, extension="csv"):
+    for path in segments(directory, extension):
+        with open_segment(path) as f:
+            for line in f:
+                yield line.decode(errors="replace")
@@ -0,0 +1,70 @@
+'''
+Asynchronous, batched writer for the greenhouse logs.
+write(record) just puts the record on a bounded queue, so the agent never
+waits on formatting or file I/O.  A background thread drains the queue,
+formats the records and hands them to the sink in batches, whenever
+batch_size records have accumulated or flush_period (wall clock) seconds
+have passed since the last batch.  If the queue is full, the record is
+dropped (and counted) rather than blocking the agent.  close() (also called
+on exit) writes out everything still queued.
+'''
+import threading, queue, time, atexit
+from log_channels import telemetry as telemetry_log
+
+class AsyncLogWriter:
+    def __init__(self, sink, format=str, max_queue=10000, batch_size=100,
+                 flush_period=1.0):
+        self.sink = sink     # Called with a list of formatted records
+        self.format = format # Called (in the writer thread) on each record
+        self.batch_size = batch_size
+        self.flush_period = flush_period
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="AsyncLogWriter",
+                                       daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, record):
+        if (self.closed): return False
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def run(self):
+        batch = []
+        last_flush = time.time()
+        done = False
+        while not done:
+            timeout = max(0, last_flush + self.flush_period - time.time())
+            try:
+                record = self.queue.get(timeout=timeout)
+                if (record is None): done = True # Sentinel from close
+                else: batch.append(self.format(record))
+            except queue.Empty:
+                pass
+            if (batch and (done or len(batch) >= self.batch_size or
+                           time.time() - last_flush >= self.flush_period)):
+                self.flush(batch)
+                batch = []
+            if (not batch): last_flush = time.time()
+
+    def flush(self, batch):
+        try:
+            self.sink(batch)
+            self.written += len(batch)
+        except Exception as e:
+            telemetry_log.error("Failed to write %d records: %s", len(batch), e)
+
+    def close(self):
+        if (self.closed): return
+        self.closed = True
+        self.queue.put(None) # Blocks, if need be, until there is room
+        self.thread.join()
+        if (self.dropped > 0):
+            telemetry_log.warning("Dropped %d records (queue full)", self.dropped)
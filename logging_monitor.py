@@ -1,21 +1,78 @@
 from monitor import *
-import logging
-import time 
-import os
+from log_writer import AsyncLogWriter
+from log_channels import telemetry as telemetry_log
+import rollups
+import atexit
+import log_segments
+
+# Columns of the CSV rows of the telemetry log, in order
+header = "time, light, temp, humid, smoist, weight,level, fan, wpump, camera, led"
+columns = ["time", "light", "temp", "humid", "smoist", "weight", "level",
+           "fan", "wpump", "camera", "led"]
+
+# Parse a line of the log into a dictionary of values.  Returns None for the
+#  header, for anything else that was logged (such as FSM chatter), and for
+#  rows that are not well formed.  An actuator that was not logged is None
+def parse_row(line):
+    fields = line.strip().split(",")
+    if (len(fields) != len(columns)): return None
+    try:
+        row = {name: float(value) for name, value in zip(columns[:7], fields)}
+        row["fan"] = {"True": True, "False": False}[fields[7]]
+        row["wpump"] = {"True": True, "False": False}[fields[8]]
+    except (ValueError, KeyError):
+        return None
+    row["camera"] = fields[9]
+    try:
+        row["led"] = float(fields[10])
+    except ValueError:
+        row["led"] = None
+    return row
+
+# Build the CSV row for a list of values, in the order of the columns
+def format_row(values):
+    return ",".join([str(value) for value in values])
+
+# A row, as the (time, bytes) that log_segments writes
+def encode(values):
+    return (values[0], (format_row(values) + "\n").encode())
 
 class LoggingMonitor(Monitor):
 
-    def __init__(self, period=10):
+    # The telemetry is written to daily segments in the greenhouse_log
+    #  directory (see log_segments), either as CSV rows (log_format "csv") or
+    #  as binary records (log_format "binary", see binary_log)
+    def __init__(self, period=10, log_format="csv"):
         super(LoggingMonitor, self).__init__("LoggingMonitor", period)
         # Put any iniitialization code here
         # BEGIN STUDENT CODE
-        log_file = "greenhouse.log"
-        if os.path.exists(log_file):
-            open(log_file, 'w').close()
-        logging.basicConfig(filename="greenhouse.log", level=logging.INFO, format="%(message)s")
-        header = "time, light, temp, humid, smoist, weight,level, fan, wpump, camera, led"
-        logging.info(header)
+        # Other messages go to their own logging channels (see log_channels)
         # END STUDENT CODE
+        if (log_format == "binary"):
+            import binary_log
+            self.log = binary_log.segmented_log()
+            record = binary_log.encode
+        elif (log_format == "csv"):
+            self.log = log_segments.SegmentedLog(header=(header + "\n").encode(),
+                                                 index_every=100)
+            record = encode
+        else:
+            raise Exception("Unknown log format %s" %log_format)
+        # Rows are formatted and written in the background (see log_writer)
+        self.writer = AsyncLogWriter(self.log.write, record)
+        # Per-minute and per-hour summaries (see rollups)
+        self.rollups = rollups.Rollups(self.log.directory)
+        self.rollup_writer = AsyncLogWriter(self.rollups.write, lambda record: record)
+        atexit.register(self.close)
+        telemetry_log.info("Logging %s telemetry every %s seconds to %s",
+                           log_format, period, self.log.directory)
+
+    def close(self):
+        for record in self.rollups.partial():
+            self.rollup_writer.write(record)
+        self.rollup_writer.close()
+        self.writer.close()
+        self.log.close()
 
     def perceive(self):
         # BEGIN STUDENT CODE
@@ -28,16 +85,20 @@ class LoggingMonitor(Monitor):
         #  actuator data, preferably as a comma-separated line of values.
         #  Make sure to timestamp the line of data
         # BEGIN STUDENT CODE
-        timestamp = time.time()  # seconds since epoch
-        # Build CSV row
-        sensor_values = [str(self.sensordata.get(k, "")) for k in [
+        # Use the sensed time, so logs of simulated runs have simulated times
+        timestamp = self.sensordata["unix_time"]  # seconds since epoch
+        # Queue the values (copying the actuator state, which keeps changing);
+        #  the writer thread builds the CSV row
+        sensor_values = [self.sensordata.get(k, "") for k in [
             "light", "temp", "humid", "smoist", "weight", "level"
         ]]
-        actuator_values = [str(self.actuator_state.get(k, "")) for k in [
+        actuator_values = [self.actuator_state.get(k, "") for k in [
             "fan", "wpump", "camera", "led"
         ]]
-        row = ",".join([str(timestamp)] + sensor_values + actuator_values)
-        logging.info(row)
+        values = [timestamp] + sensor_values + actuator_values
+        self.writer.write(values)
+        for record in self.rollups.add(values):
+            self.rollup_writer.write(record)
         # END STUDENT CODE
         pass
 
@@ -32,18 +32,24 @@ class Monitor(object):
     def activate(self):
         pass
 
+    # Called whenever the executive's schedule changes
+    def scheduleChanged(self):
+        pass
+
     def perceive(self):
         pass
 
     def monitor(self):
         pass
 
-    def doMonitor(self):
-        now = self.sensors.getTime()
+    # sensordata is the reading shared by everything running this step;
+    #  if not given, the sensors are read
+    def doMonitor(self, sensordata=None):
+        now = sensordata.unix_time if sensordata else self.sensors.getTime()
         dt = now - self.last_time
         if (dt >= self.period):
             self.dt = dt
-            self.sensordata = self.sensors.doSense()
+            self.sensordata = sensordata or self.sensors.doSense()
             self.perceive()
             self.monitor()
             self.last_time = now
@@ -0,0 +1,132 @@
+'''
+Opt-in latency profiler for the greenhouse agents.
+Profiler.instrument(agent) replaces the step functions of the agent's layers,
+behaviors and monitors with timing wrappers (as instance attributes, so
+nothing changes, and nothing is paid, unless an agent is instrumented).
+For each component it records the number of calls, a histogram of wall times
+(in power-of-two microsecond bins), the net number of memory blocks allocated
+and, if trace_memory is set, the peak memory allocated during the call
+(using tracemalloc).  Times are inclusive: a layer's time includes the time
+of the behaviors and monitors it runs.  For each behavior, it also counts
+FSM triggers by the transition they caused (for threshold behaviors, the
+transitions their bank counts), and the steps the behavioral layer skipped
+because the behavior's inputs had not changed.
+The statistics are written as JSON to filename every period (wall clock)
+seconds while the agent runs, and once more on exit.
+'''
+import time, sys, json, atexit
+import tracemalloc
+
+class Stats:
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = {} # Upper bound of bin (in usecs) -> count
+        self.blocks = 0
+        self.peak_memory = 0
+
+    def record(self, elapsed, blocks, memory):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        usecs = 1 << int(elapsed*1e6).bit_length()
+        self.histogram[usecs] = self.histogram.get(usecs, 0) + 1
+        self.blocks += blocks
+        self.peak_memory = max(self.peak_memory, memory)
+
+    def report(self):
+        return {"calls": self.calls, "total_ms": 1000*self.total,
+                "mean_ms": 1000*self.total/max(1, self.calls),
+                "max_ms": 1000*self.max,
+                "histogram_us": {str(usecs) : self.histogram[usecs]
+                                 for usecs in sorted(self.histogram)},
+                "net_blocks": self.blocks, "peak_bytes": self.peak_memory}
+
+class Profiler:
+    def __init__(self, filename="profile.json", period=60, trace_memory=False):
+        self.filename = filename
+        self.period = period
+        self.stats = {}    # Component name -> Stats
+        self.triggers = {} # Behavior name -> {"trigger:source->dest": count}
+        self.last_dump = time.time()
+        self.behavioral = None
+        # Peak memory so far of each wrapped call in progress (outermost
+        #  first).  Since the calls are nested, and each resets the
+        #  tracemalloc peak, an inner call hands its peak on to the one
+        #  enclosing it
+        self.peaks = []
+        if (trace_memory and not tracemalloc.is_tracing()): tracemalloc.start()
+
+    def instrument(self, agent):
+        behavioral = agent.getBehavioralLayer()
+        self.behavioral = behavioral
+        for behavior in behavioral.behaviors:
+            for method in ("doStep", "start", "pause"):
+                self.wrap(behavior, method, "%s.%s" %(behavior.name, method))
+            if (hasattr(behavior, "trigger")): self.wrapTrigger(behavior)
+            elif (hasattr(behavior, "bank")):
+                self.triggers[behavior.name] = behavior.bank.transitions[behavior.name]
+        self.wrap(behavioral, "doStep", "BehavioralLayer.doStep", True)
+        if (hasattr(agent, "getExecutiveLayer")):
+            executive = agent.getExecutiveLayer()
+            for monitor in executive.monitors:
+                self.wrap(monitor, "doMonitor", "%s.doMonitor" %monitor.name)
+            self.wrap(executive, "doStep", "ExecutiveLayer.doStep", True)
+            self.wrap(agent.getPlanningLayer(), "doStep",
+                      "PlanningLayer.doStep", True)
+        atexit.register(self.dump)
+
+    # Replace obj.method with a version that records its cost under name.
+    #  If periodic, check whether it is time to dump the statistics after
+    #  each call
+    def wrap(self, obj, method, name, periodic=False):
+        original = getattr(obj, method)
+        stats = self.stats.setdefault(name, Stats())
+        trace = tracemalloc.is_tracing()
+        def timed(*args, **kwargs):
+            if (trace):
+                memory, peak = tracemalloc.get_traced_memory()
+                if (self.peaks): self.peaks[-1] = max(self.peaks[-1], peak)
+                self.peaks.append(memory)
+                tracemalloc.reset_peak()
+            blocks = sys.getallocatedblocks()
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                blocks = sys.getallocatedblocks() - blocks
+                peak = 0
+                if (trace):
+                    peak = max(self.peaks.pop(), tracemalloc.get_traced_memory()[1])
+                    if (self.peaks): self.peaks[-1] = max(self.peaks[-1], peak)
+                    tracemalloc.reset_peak()
+                    peak -= memory
+                stats.record(elapsed, blocks, peak)
+                if (periodic): self.maybeDump()
+        setattr(obj, method, timed)
+
+    def wrapTrigger(self, behavior):
+        original = behavior.trigger
+        counts = self.triggers.setdefault(behavior.name, {})
+        def trigger(event, *args, **kwargs):
+            source = behavior.state
+            result = original(event, *args, **kwargs)
+            key = "%s:%s->%s" %(event, source, behavior.state)
+            counts[key] = counts.get(key, 0) + 1
+            return result
+        behavior.trigger = trigger
+
+    def maybeDump(self):
+        if (time.time() - self.last_dump >= self.period): self.dump()
+
+    def dump(self):
+        self.last_dump = time.time()
+        report = {"time": self.last_dump,
+                  "components": {name: self.stats[name].report()
+                                 for name in sorted(self.stats)},
+                  "triggers": self.triggers,
+                  "skipped_steps": getattr(self.behavioral, "skipped", {})}
+        with open(self.filename, "w") as f:
+            json.dump(report, f, indent=1)
@@ -0,0 +1,147 @@
+'''
+Replays a telemetry log through the greenhouse agents, without ROS.
+The logged sensor readings are fed, one row at a time, as the doSense
+readings of the agent (on a virtual clock set to the time of each row), as
+fast as the agent can step.  The actuator commands the behaviors issue are
+recorded rather than sent anywhere, and the resulting actuator state is
+compared with the actuator state in the next logged row, to find where a
+(changed) agent would have acted differently from the one that was logged.
+Since the logged agent was stepped every second, and rows are logged less
+often, some differences around each change of state are expected; given a
+step (in seconds), the agent is also stepped that often between rows (with
+the readings of the last row), as it was when the log was made.  Note that
+the logged readings do not respond to the replayed commands, so a behavior
+that adjusts an actuator until a reading is in range (such as the LEDs and
+the light level) keeps diverging once its commands differ from the log.
+'''
+from hardware import *
+from sim_hardware import VirtualClock, time_since_midnight
+import os, time
+import log_segments, logging_monitor, log_query
+
+# The rows (see logging_monitor.parse_row) of a CSV log file, or of a log
+#  directory (of CSV or binary segments)
+def read_rows(source):
+    if (os.path.isdir(source)):
+        log_format = "csv" if log_segments.segments(source, "csv") else "binary"
+        return list(log_query.query(0, float("inf"), source, log_format))
+    with open(source) as log_file:
+        rows = [logging_monitor.parse_row(line) for line in log_file]
+    return [row for row in rows if row is not None]
+
+class ReplayClock(VirtualClock):
+    def __init__(self, rows):
+        if (not rows): raise Exception("No rows to replay")
+        self.rows = rows
+        super().__init__(rows[0]["time"], rows[-1]["time"] - rows[0]["time"])
+
+    # Move to the time of the given row (not calling the listeners, since
+    #  nothing is simulated in between)
+    def seek(self, row):
+        self.time = row["time"]
+
+class ReplaySensors(Sensors):
+
+    light_level = 0
+    temperature = 0
+    humidity = 0
+    weight = 0
+    moisture = 0
+    wlevel = 0
+    changed = False
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.setRow(clock.rows[0])
+
+    def getTime(self):
+        return self.clock.now()
+
+    def setRow(self, row):
+        readings = (row["light"], row["temp"], row["humid"], row["smoist"])
+        if (readings != (self.light_level, self.temperature, self.humidity,
+                         self.moisture)):
+            self.changed = True
+        self.light_level, self.temperature, self.humidity, self.moisture = readings
+        self.weight = row["weight"]
+        self.wlevel = row["level"]
+
+    def doSense(self):
+        now = self.getTime()
+        return SensorData(now, time_since_midnight(now), self.light_level,
+                          self.temperature, self.humidity, self.weight,
+                          self.moisture, self.wlevel, [self.light_level]*2,
+                          [self.temperature]*2, [self.humidity]*2,
+                          [self.weight/2]*2, [self.moisture]*2, self.wlevel)
+
+class ReplayActuators(Actuators):
+
+    def __init__(self, clock, coalesce=False):
+        self.clock = clock
+        self.coalesce = coalesce
+        self.actuator_state = {"fan": False, "wpump": False, "led": 0, "camera": ""}
+        self.commands = [] # (time, actuator, value)
+
+    def doActions(self, actions_tuple):
+        for action, value in actions_tuple[2].items():
+            self.command(action, value)
+
+    def send(self, actuator, value):
+        self.actuator_state[actuator] = value
+        self.commands.append((self.clock.now(), actuator, value))
+
+# The LED level is compared exactly, the fan and pump as on or off.
+#  Actuators that were not logged never differ
+def differs(actuator, logged, replayed):
+    if (logged is None): return False
+    if (actuator == "led"): return logged != replayed
+    return bool(logged) != bool(replayed)
+
+# Run the agent (built with a ReplayClock) over all the rows of the clock,
+#  comparing its actuator state with the logged state of the next row.
+#  Returns the number of mismatches of each actuator, the number of rows
+#  in which it was compared (rows that did not log it are not), and a list
+#  of (time, actuator, logged value, replayed value) for each mismatch
+def replay(agent, step=None):
+    clock, sensors, actuators = agent.virtual_clock, agent.sensors, agent.actuators
+    mismatches = {"fan": 0, "wpump": 0, "led": 0}
+    compared = {"fan": 0, "wpump": 0, "led": 0}
+    differences = []
+    agent.start()
+    for i, row in enumerate(clock.rows):
+        clock.seek(row)
+        sensors.setRow(row)
+        # The logged actuator state is the one before the agent stepped
+        if (i > 0):
+            for actuator in mismatches:
+                logged, replayed = row[actuator], actuators.actuator_state[actuator]
+                if (logged is not None): compared[actuator] += 1
+                if (differs(actuator, logged, replayed)):
+                    mismatches[actuator] += 1
+                    differences.append((row["time"], actuator, logged, replayed))
+        agent.step(sensors.doSense())
+        if (step and i + 1 < len(clock.rows)):
+            t = row["time"] + step
+            while (t < clock.rows[i+1]["time"]):
+                clock.time = t
+                agent.step(sensors.doSense())
+                t += step
+    return mismatches, compared, differences
+
+def report(agent, source, step=None, max_differences=10):
+    start = time.perf_counter()
+    mismatches, compared, differences = replay(agent, step)
+    elapsed = time.perf_counter() - start
+    rows = agent.virtual_clock.rows
+    print("Replayed %d rows of %s (%.1f hours) in %.2f seconds (%.0f rows/sec)"
+          %(len(rows), source, (rows[-1]["time"] - rows[0]["time"])/3600.0,
+            elapsed, len(rows)/max(elapsed, 1e-9)))
+    print("%d actuator commands" %len(agent.actuators.commands))
+    for actuator, count in mismatches.items():
+        if (compared[actuator] == 0):
+            print("  %-6s not logged" %actuator)
+        else:
+            print("  %-6s %d of %d rows differ" %(actuator, count, compared[actuator]))
+    for t, actuator, logged, replayed in differences[:max_differences]:
+        print("  %.1f %s: logged %s, replayed %s" %(t, actuator, logged, replayed))
+    return mismatches
@@ -0,0 +1,140 @@
+'''
+A fixed-capacity window of the most recent readings of a sensor, for
+smoothing.  The values are kept in a preallocated array('d'), with a
+running sum and sum of squares (so the mean and variance are O(1) per
+reading, however long the window) and a sorted copy (for the median).  The
+sums are of the differences from a recent mean (to keep the variance
+precise for large values), and to keep rounding errors from accumulating
+they are recomputed exactly once every RECOMPUTE (or capacity, if more)
+readings.
+If reject is set, a reading more than reject standard deviations (and
+more than min_spread) from the median of a window of at least 3 readings
+is an outlier: append drops it and returns False.  Since a reading that
+stays away is a real change rather than a spike, only max_rejects outliers
+in a row are dropped.
+Usage: python ring_buffer.py [window] [readings] - benchmark against
+  rebuilding a list each reading
+'''
+from array import array
+from bisect import bisect_left, insort
+import sys, time, math, random
+
+RECOMPUTE = 1024
+
+class RingBuffer:
+    def __init__(self, capacity, reject=None, min_spread=0.0, max_rejects=3):
+        if (capacity < 1): raise Exception("Capacity must be positive: %s" %capacity)
+        self.capacity = capacity
+        self.reject = reject
+        self.min_spread = min_spread
+        self.max_rejects = max_rejects
+        self.recompute = max(capacity, RECOMPUTE)
+        self.data = array('d', bytes(8*capacity))
+        self.sorted = []
+        self.rejected = 0 # Total number of outliers dropped
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.head = 0 # Where the next reading goes
+        self.shift = None # The sums are of value - shift
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.sorted.clear()
+        self.rejects = 0 # Outliers dropped in a row
+        self.updates = 0 # Readings since the sums were recomputed
+
+    def __len__(self):
+        return self.count
+
+    def full(self):
+        return self.count == self.capacity
+
+    # Add a reading, dropping the oldest if the window is full.  Returns
+    #  False if the reading is dropped as an outlier
+    def append(self, value):
+        if (self.reject is not None):
+            if (self.is_outlier(value) and self.rejects < self.max_rejects):
+                self.rejects += 1
+                self.rejected += 1
+                return False
+            self.rejects = 0
+        if (self.shift is None): self.shift = value
+        if (self.count == self.capacity):
+            old = self.data[self.head]
+            delta = old - self.shift
+            self.sum -= delta
+            self.sumsq -= delta*delta
+            del self.sorted[bisect_left(self.sorted, old)]
+        else:
+            self.count += 1
+        self.data[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        delta = value - self.shift
+        self.sum += delta
+        self.sumsq += delta*delta
+        insort(self.sorted, value)
+        self.updates += 1
+        if (self.updates >= self.recompute): self.resum()
+        return True
+
+    def resum(self):
+        self.shift = math.fsum(self.sorted)/self.count
+        self.sum = math.fsum([v - self.shift for v in self.sorted])
+        self.sumsq = math.fsum([(v - self.shift)**2 for v in self.sorted])
+        self.updates = 0
+
+    def is_outlier(self, value):
+        if (self.reject is None or self.count < 3): return False
+        spread = max(self.reject*self.std(), self.min_spread)
+        return abs(value - self.median()) > spread
+
+    # The readings in the window, oldest first
+    def values(self):
+        if (not self.full()): return self.data[:self.count].tolist()
+        return (self.data[self.head:] + self.data[:self.head]).tolist()
+
+    def last(self):
+        return self.data[self.head - 1] if self.count > 0 else math.nan
+
+    def mean(self):
+        return self.shift + self.sum/self.count if self.count > 0 else math.nan
+
+    def variance(self):
+        if (self.count == 0): return math.nan
+        mean = self.sum/self.count
+        return max(0.0, self.sumsq/self.count - mean*mean)
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+    def median(self):
+        if (self.count == 0): return math.nan
+        middle = self.count//2
+        if (self.count % 2 == 1): return self.sorted[middle]
+        return (self.sorted[middle-1] + self.sorted[middle])/2.0
+
+# The window RaiseSMoist used to keep
+def sliding_window(window, item, length):
+    if (len(window) == length): window = window[1:]
+    window.append(item)
+    return window, sum(window)/float(len(window))
+
+if __name__ == '__main__':
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    readings = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    values = [random.gauss(550, 20) for i in range(readings)]
+    start = time.perf_counter()
+    window = []
+    for value in values:
+        window, list_mean = sliding_window(window, value, length)
+    list_time = time.perf_counter() - start
+    start = time.perf_counter()
+    ring = RingBuffer(length)
+    for value in values:
+        ring.append(value)
+        ring_mean = ring.mean()
+    ring_time = time.perf_counter() - start
+    print("window %d, %d readings: list %.2f usec/reading, ring buffer %.2f usec/reading (means %.6f, %.6f)"
+          %(length, readings, 1e6*list_time/readings, 1e6*ring_time/readings,
+            list_mean, ring_mean))
@@ -0,0 +1,149 @@
+'''
+Incremental rollups of the telemetry.
+For each rollup period (by default a minute and an hour), the samples
+logged by LoggingMonitor are summarized as they arrive, in constant time
+per sample: the min, max, mean and last value of each sensor, and the
+fraction of the samples with the fan, pump and LEDs on.  When a sample
+falls in a new period, the summary of the previous one is appended, as a
+fixed-width binary record (with a binary_log header), to
+rollup_<period>.ghroll in the log directory, so that long-term views only
+need to read a few KB.  On shutdown the periods in progress are written
+too, so after a restart within a period the file has more than one
+record for it; read_rollups merges them.
+Usage: python rollups.py [period] [directory] - print the rollups
+'''
+import numpy as np
+import sys, os, math, datetime
+import binary_log, log_segments
+
+SENSORS = binary_log.SENSORS
+ACTUATORS = ["fan", "wpump", "led"]
+STATS = ["min", "max", "mean", "last"]
+DTYPE = np.dtype([("start", "<f8"), ("samples", "<u4")] +
+                 [("%s_%s" %(sensor, stat), "<f4") for sensor in SENSORS for stat in STATS] +
+                 [("%s_on" %actuator, "<f4") for actuator in ACTUATORS])
+
+class Rollup:
+    def __init__(self, period):
+        self.period = period
+        self.start = None
+
+    def reset(self, start):
+        self.start = start
+        self.samples = 0
+        self.min = [math.inf]*len(SENSORS)
+        self.max = [-math.inf]*len(SENSORS)
+        self.sum = [0.0]*len(SENSORS)
+        self.last = [math.nan]*len(SENSORS)
+        self.on = [0]*len(ACTUATORS)
+
+    # Add a sample: the sensor values, and whether each actuator is on.
+    #  Returns the record of the previous period, if the sample starts a new one
+    def add(self, t, sensors, actuators):
+        start = t - t % self.period
+        record = None
+        if (start != self.start):
+            record = self.record()
+            self.reset(start)
+        self.samples += 1
+        for i, value in enumerate(sensors):
+            if (value < self.min[i]): self.min[i] = value
+            if (value > self.max[i]): self.max[i] = value
+            self.sum[i] += value
+            self.last[i] = value
+        for i, on in enumerate(actuators):
+            if (on): self.on[i] += 1
+        return record
+
+    # The record of the current period so far (None if it has no samples)
+    def record(self):
+        if (self.start is None or self.samples == 0): return None
+        values = [self.start, self.samples]
+        for i in range(len(SENSORS)):
+            values += [self.min[i], self.max[i], self.sum[i]/self.samples, self.last[i]]
+        values += [on/self.samples for on in self.on]
+        return np.array([tuple(values)], DTYPE).tobytes()
+
+class Rollups:
+    def __init__(self, directory=log_segments.LOG_DIR, periods=(60, 3600)):
+        self.directory = directory
+        self.rollups = [Rollup(period) for period in periods]
+        os.makedirs(directory, exist_ok=True)
+
+    # Add a row of values, in the order of logging_monitor.columns.  Returns
+    #  the (period, record) of any periods that have ended
+    def add(self, values):
+        t, sensors = values[0], values[1:7]
+        if ("" in sensors): return []
+        fan, wpump, camera, led = values[7:]
+        actuators = (bool(fan), bool(wpump), bool(led))
+        records = []
+        for rollup in self.rollups:
+            record = rollup.add(t, sensors, actuators)
+            if (record): records.append((rollup.period, record))
+        return records
+
+    # The records of the periods in progress (when shutting down)
+    def partial(self):
+        return [(rollup.period, rollup.record()) for rollup in self.rollups
+                if rollup.record()]
+
+    # Append (period, record) pairs to the rollup files
+    def write(self, records):
+        for period, record in records:
+            path = rollup_path(period, self.directory)
+            new = not os.path.exists(path)
+            with open(path, "ab") as f:
+                if (new): f.write(binary_log.header(DTYPE))
+                f.write(record)
+
+def rollup_path(period, directory=log_segments.LOG_DIR):
+    return os.path.join(directory, "rollup_%d.ghroll" %period)
+
+# Combine record b (written later) of the same period into record a
+def combine(a, b):
+    samples = a["samples"] + b["samples"]
+    for sensor in SENSORS:
+        a[sensor + "_min"] = min(a[sensor + "_min"], b[sensor + "_min"])
+        a[sensor + "_max"] = max(a[sensor + "_max"], b[sensor + "_max"])
+        a[sensor + "_mean"] = ((a[sensor + "_mean"]*a["samples"] +
+                                b[sensor + "_mean"]*b["samples"])/samples)
+        a[sensor + "_last"] = b[sensor + "_last"]
+    for actuator in ACTUATORS:
+        a[actuator + "_on"] = ((a[actuator + "_on"]*a["samples"] +
+                                b[actuator + "_on"]*b["samples"])/samples)
+    a["samples"] = samples
+
+# Merge the records that have the same start (the parts of a period
+#  written before and after a restart)
+def merge(records):
+    if (len(np.unique(records["start"])) == len(records)): return records
+    merged = []
+    index = {} # Start -> index in merged
+    for record in records:
+        i = index.get(record["start"])
+        if (i is None):
+            index[record["start"]] = len(merged)
+            merged.append(record.copy())
+        else:
+            combine(merged[i], record)
+    return np.array(merged, DTYPE)
+
+# The rollups of a period, as a structured array, one record per period
+def read_rollups(period, directory=log_segments.LOG_DIR):
+    return merge(binary_log.read_segment(rollup_path(period, directory)))
+
+if __name__ == '__main__':
+    period = int(sys.argv[1]) if len(sys.argv) > 1 else 3600
+    directory = sys.argv[2] if len(sys.argv) > 2 else log_segments.LOG_DIR
+    records = read_rollups(period, directory)
+    print("%-16s %7s %s %s" %("start", "samples",
+                              " ".join("%-17s" %("%s min/mean/max" %s) for s in SENSORS[:4]),
+                              " ".join("%5s" %a for a in ACTUATORS)))
+    for record in records:
+        print("%-16s %7d %s %s"
+              %(datetime.datetime.fromtimestamp(record["start"]).strftime("%Y-%m-%d %H:%M"),
+                record["samples"],
+                " ".join("%5.0f/%5.0f/%5.0f" %(record[s + "_min"], record[s + "_mean"],
+                                               record[s + "_max"]) for s in SENSORS[:4]),
+                " ".join("%5.2f" %record[a + "_on"] for a in ACTUATORS)))
@@ -19,6 +19,10 @@ class ROSSensors(Sensors):
     weight_raw = [0, 0]
     moisture_raw = [0, 0]
     wlevel_raw = 0
+    # Set whenever a callback receives a light, temperature, humidity or soil
+    #  moisture value different from the last one (the readings that the
+    #  behaviors react to; weight and level are only used along with timers)
+    changed = False
 
     def __init__(self, agent):
         self.agent = agent
@@ -36,25 +40,29 @@ class ROSSensors(Sensors):
     def getTime(self):
         return get_ros_time(self.agent)
 
+    def setReading(self, attr, value):
+        if (value != getattr(self, attr)): self.changed = True
+        setattr(self, attr, value)
+
     # Implement subscriber handlers here
     def light_callback(self, data):
         # BEGIN STUDENT CODE
         self.light_level_raw = data.data
-        self.light_level = sum(data.data)/2.0
+        self.setReading('light_level', sum(data.data)/2.0)
         # END STUDENT CODE
         pass
 
     def temp_callback(self, data):
         # BEGIN STUDENT CODE
         self.temperature_raw = data.data
-        self.temperature = sum(data.data)/2.0
+        self.setReading('temperature', sum(data.data)/2.0)
         # END STUDENT CODE
         pass
 
     def humid_callback(self, data):
         # BEGIN STUDENT CODE
         self.humidity_raw = data.data
-        self.humidity = sum(data.data)/2.0
+        self.setReading('humidity', sum(data.data)/2.0)
         # END STUDENT CODE
         pass
 
@@ -69,7 +77,7 @@ class ROSSensors(Sensors):
     def smoist_callback(self, data):
         # BEGIN STUDENT CODE
         self.moisture_raw = data.data
-        self.moisture = sum(data.data)/2.0
+        self.setReading('moisture', sum(data.data)/2.0)
         # END STUDENT CODE
         pass
 
@@ -83,23 +91,20 @@ class ROSSensors(Sensors):
     def doSense(self):
         #update the dictionary to return your values
         now = self.getTime()
-        return {"unix_time":now,
-                "midnight_time":time_since_midnight(now),
-                "light": self.light_level,
-                "temp": self.temperature, "humid": self.humidity,
-                "weight": self.weight,"smoist": self.moisture,
-                "level": self.wlevel, "light_raw": self.light_level_raw,
-                "temp_raw": self.temperature_raw, "humid_raw": self.humidity_raw,
-                "weight_raw": self.weight_raw, "smoist_raw": self.moisture_raw,
-                "level_raw": self.wlevel_raw}
+        return SensorData(now, time_since_midnight(now), self.light_level,
+                          self.temperature, self.humidity, self.weight,
+                          self.moisture, self.wlevel, self.light_level_raw,
+                          self.temperature_raw, self.humidity_raw,
+                          self.weight_raw, self.moisture_raw, self.wlevel_raw)
 
 #actuators commanded as a file
 class ROSActuators(Actuators):
     actuators = {}
     actuator_state = {"fan": False, "wpump": False, "led": 0, "camera": ""}
 
-    def __init__(self, agent):
+    def __init__(self, agent, coalesce=False):
         self.agent = agent
+        self.coalesce = coalesce
         for actuator in actuator_names:
             topic = actuator if actuator == 'camera' else '%s_input' %actuator
             self.actuators[actuator] = \
@@ -109,13 +114,16 @@ class ROSActuators(Actuators):
         # Publish actuator commands here
         # BEGIN STUDENT CODE
         for action, value in actions_tuple[2].items():
-            self.actuator_state[action] = value
-            self.actuators[action].publish(actuator_types[action](data=value))
+            self.command(action, value)
         # END STUDENT CODE
         # Give the messages a chance to propagate
         #spin_for(self.agent, 0.5)
         pass
 
+    def send(self, actuator, value):
+        self.actuator_state[actuator] = value
+        self.actuators[actuator].publish(actuator_types[actuator](data=value))
+
 # BEGIN SANITIZE ALL
 if __name__ == '__main__':
     import rclpy.node
@@ -1,5 +1,6 @@
 import matplotlib.pyplot as plt
-import re
+import re, os, sys, time, datetime, pickle, hashlib
+from bisect import bisect_right
 
 def HHMM_to_mins(HHMM):
     parts = HHMM.split(":")
@@ -25,6 +26,281 @@ def readSchedule(file):
                                             HHMM_to_mins(parts[2])))
         return sched
 
+# Compile a schedule into a timeline of transition points, so that the
+#  behaviors active at any time can be found with a binary search.
+# Returns (times, active): times is the sorted list of minutes since midnight
+#  at which the set of active behaviors changes (always starting at 0), and
+#  active[i] is the tuple of behaviors running in [times[i], times[i+1]),
+#  in schedule order
+def scheduleTimeline(schedule):
+    deltas = {0: {}}
+    for behavior, times in schedule.items():
+        for start, end in times:
+            if (start >= end): continue # Empty interval - never active
+            deltas.setdefault(start, {})
+            deltas.setdefault(end, {})
+            deltas[start][behavior] = deltas[start].get(behavior, 0) + 1
+            deltas[end][behavior] = deltas[end].get(behavior, 0) - 1
+
+    counts = dict.fromkeys(schedule, 0)
+    times, active = [], []
+    for point in sorted(deltas):
+        for behavior, delta in deltas[point].items():
+            counts[behavior] += delta
+        running = tuple(b for b in schedule if counts[b] > 0)
+        # Only keep points where the set of active behaviors actually changes
+        if (not active or running != active[-1]):
+            times.append(point)
+            active.append(running)
+    return times, active
+
+# Sort each behavior's intervals, merging any that overlap or abut
+def normalizeSchedule(schedule):
+    normalized = {}
+    for behavior, times in schedule.items():
+        merged = []
+        for start, end in sorted(times):
+            if (merged and start <= merged[-1][1]):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        normalized[behavior] = merged
+    return normalized
+
+# The behaviors whose intervals differ between the two schedules
+def diffSchedules(old, new):
+    return [behavior for behavior in list(old) + [b for b in new if b not in old]
+            if old.get(behavior) != new.get(behavior)]
+
+# A schedule that has been checked and compiled.  Each entry is
+#  (behavior, start, end, days, dates): days is the set of weekdays (0 is
+#  Monday) the entry applies to, and dates the (first, last) date ordinals
+#  it applies to; either may be None, meaning there is no restriction.
+# Dates on which the same entries apply share one normalized daily schedule
+#  and timeline, which is compiled the first time it is needed.  Finding it
+#  takes a binary search over the boundaries of the date ranges
+class CompiledSchedule:
+    def __init__(self, entries):
+        self.entries = entries
+        self.weekly = any(days is not None for _, _, _, days, _ in entries)
+        self.breaks = sorted({d for _, _, _, _, dates in entries if dates
+                              for d in (dates[0], dates[1]+1)})
+        self.days = {}
+
+    def behaviors(self):
+        return list(dict.fromkeys(entry[0] for entry in self.entries))
+
+    def check_names(self, names, file=""):
+        unknown = [b for b in self.behaviors() if b not in names]
+        if (unknown):
+            raise Exception("Unknown behaviors in schedule %s: %s"
+                            %(file, ", ".join(unknown)))
+
+    # The (schedule, timeline) for the day containing unix_time
+    def daySchedule(self, unix_time):
+        return self.dateSchedule(datetime.date.fromtimestamp(unix_time))
+
+    def dateKey(self, date):
+        return (date.weekday() if self.weekly else 0,
+                bisect_right(self.breaks, date.toordinal()))
+
+    def dateSchedule(self, date):
+        key = self.dateKey(date)
+        if (key not in self.days):
+            schedule = {}
+            for behavior, start, end, days, dates in self.entries:
+                if (days is not None and date.weekday() not in days): continue
+                if (dates and not dates[0] <= date.toordinal() <= dates[1]):
+                    continue
+                schedule.setdefault(behavior, []).append((start, end))
+            schedule = normalizeSchedule(schedule)
+            self.days[key] = (schedule, scheduleTimeline(schedule))
+        return self.days[key]
+
+    # One date for each distinct daily schedule, along with that schedule
+    def variants(self):
+        starts = [self.breaks[0] - 1] if self.breaks else [datetime.date.today().toordinal()]
+        starts += self.breaks
+        keys = set()
+        for start in starts:
+            for offset in range(7 if self.weekly else 1):
+                date = datetime.date.fromordinal(start + offset)
+                if (self.dateKey(date) not in keys):
+                    keys.add(self.dateKey(date))
+                    yield date, self.dateSchedule(date)
+
+    # The behaviors active at unix_time
+    def activeAt(self, unix_time):
+        schedule, (times, active) = self.daySchedule(unix_time)
+        dt = datetime.datetime.fromtimestamp(unix_time)
+        mins = dt.hour*60 + dt.minute + dt.second/60.0
+        return active[bisect_right(times, mins) - 1]
+
+# The actuators that each behavior commands
+behavior_actuators = {"LightBehavior": ("led",), "RaiseTempBehavior": ("led",),
+                      "LowerTempBehavior": ("fan",),
+                      "LowerHumidBehavior": ("fan",),
+                      "RaiseMoistBehavior": ("wpump",),
+                      "LowerMoistBehavior": ("fan",),
+                      "TakeImageBehavior": ("led", "camera"),
+                      "EmailBehavior": ()}
+
+# Sweep the timeline of a daily schedule for windows in which more than one
+#  behavior commands the same actuator.  Returns a list of
+#  (actuator, start, end, behaviors) windows, in minutes since midnight,
+#  and the total contended minutes for each actuator
+def findConflicts(timeline, actuators=behavior_actuators):
+    times, active = timeline
+    conflicts, totals = [], {}
+    current = {} # Actuator -> its window being swept, if contended
+    for index, running in enumerate(active):
+        start = times[index]
+        end = times[index+1] if index+1 < len(times) else 24*60
+        contenders = {}
+        for behavior in running:
+            for actuator in actuators.get(behavior, ()):
+                contenders.setdefault(actuator, []).append(behavior)
+        for actuator, behaviors in contenders.items():
+            if (len(behaviors) < 2): continue
+            totals[actuator] = totals.get(actuator, 0) + end - start
+            window = current.get(actuator)
+            if (window and window[2] == start and window[3] == behaviors):
+                window[2] = end # Same contention continues
+            else:
+                current[actuator] = [actuator, start, end, behaviors]
+                conflicts.append(current[actuator])
+        for actuator in list(current):
+            if (len(contenders.get(actuator, ())) < 2): del current[actuator]
+    return [tuple(c) for c in conflicts], totals
+
+def conflictReport(conflicts, totals):
+    lines = ["%s: %s-%s %s" %(actuator, mins_to_HHMM(start), mins_to_HHMM(end),
+                              ", ".join(behaviors))
+             for actuator, start, end, behaviors in conflicts]
+    lines += ["%s contended for %d minutes" %(actuator, totals[actuator])
+              for actuator in sorted(totals)]
+    return lines
+
+# Each line is a behavior, a time interval and, optionally, the days of the
+#  week (such as Mon,Wed,Fri or Mon-Fri) and/or the dates (such as 2026-03-01
+#  or 2026-03-01..2026-04-15) on which the interval applies
+line_pattern = re.compile(r'^(\S+)\s+(\d+):(\d+)-(\d+):(\d+)((?:\s+\S+)*)$')
+weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+dates_pattern = re.compile(r'^(\d{4}-\d\d-\d\d)(?:\.\.(\d{4}-\d\d-\d\d))?$')
+
+def parse_time(file, lineno, hours, mins):
+    hours, mins = int(hours), int(mins)
+    if (mins >= 60 or hours*60 + mins > 24*60):
+        raise Exception("Invalid time in schedule %s, line %d: %d:%.2d"
+                        %(file, lineno, hours, mins))
+    return hours*60 + mins
+
+def parse_days(spec):
+    days = set()
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        first = weekdays.index(first)
+        last = weekdays.index(last) if last else first
+        days.update((first + i)%7 for i in range((last - first)%7 + 1))
+    return frozenset(days)
+
+def parse_dates(spec):
+    match = dates_pattern.match(spec)
+    first = datetime.date.fromisoformat(match.group(1)).toordinal()
+    last = (datetime.date.fromisoformat(match.group(2)).toordinal()
+            if match.group(2) else first)
+    if (first > last): raise ValueError("dates out of order")
+    return (first, last)
+
+def parse_qualifiers(file, lineno, line, qualifiers):
+    days = dates = None
+    for qualifier in qualifiers.split():
+        try:
+            if (days is None and qualifier[0].isalpha()):
+                days = parse_days(qualifier)
+            elif (dates is None and dates_pattern.match(qualifier)):
+                dates = parse_dates(qualifier)
+            else: raise ValueError(qualifier)
+        except ValueError:
+            raise Exception("Invalid days or dates in schedule %s, line %d: %s"
+                            %(file, lineno, line))
+    return days, dates
+
+# Like readSchedule, but reports where any error is, rejects invalid times
+#  and empty intervals, and allows day and date qualifiers
+def parseSchedule(file):
+    entries = []
+    with open(file,"r") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if (not line): continue
+            match = line_pattern.match(line)
+            if (not match):
+                raise Exception("Syntax error reading schedule %s, line %d: %s"
+                                %(file, lineno, line))
+            behaviorname = match.group(1)
+            start = parse_time(file, lineno, match.group(2), match.group(3))
+            end = parse_time(file, lineno, match.group(4), match.group(5))
+            if (start >= end):
+                raise Exception("Empty interval in schedule %s, line %d: %s"
+                                %(file, lineno, line))
+            days, dates = parse_qualifiers(file, lineno, line, match.group(6))
+            entries.append((behaviorname, start, end, days, dates))
+    return entries
+
+# Bump whenever what is cached changes
+CACHE_VERSION = 2
+# Compiled schedules already loaded by this process: file -> (stat, compiled)
+compiled_schedules = {}
+
+def cacheFile(file):
+    directory, name = os.path.split(os.path.abspath(file))
+    return os.path.join(directory, ".%s.cache" %name)
+
+# Compile the schedule file, checking that the behaviors it names are among
+#  names (if given).  The compiled schedule is cached, both in memory and on
+#  disk (next to the schedule file), keyed by the file's modification time
+#  and size and, if those change, by a hash of its contents
+def loadSchedule(file, names=None):
+    path = os.path.abspath(file)
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    if (path in compiled_schedules and compiled_schedules[path][0] == key):
+        compiled = compiled_schedules[path][1]
+    else:
+        compiled = loadCachedSchedule(path, key)
+        compiled_schedules[path] = (key, compiled)
+    if (names is not None): compiled.check_names(names, file)
+    return compiled
+
+def loadCachedSchedule(path, key):
+    cache = {}
+    try:
+        with open(cacheFile(path), "rb") as f: cache = pickle.load(f)
+    except Exception: pass # No usable cache
+    if (cache.get("version") != CACHE_VERSION): cache = {}
+    if (cache.get("key") == key):
+        return CompiledSchedule(cache["entries"])
+
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    if (cache.get("hash") == digest): # Touched, but not changed
+        compiled = CompiledSchedule(cache["entries"])
+    else:
+        print(f"Compiling schedule from {path}")
+        compiled = CompiledSchedule(parseSchedule(path))
+    # Store only built-in types, so the cache can be read no matter how
+    #  this module was loaded
+    cache = {"version": CACHE_VERSION, "key": key, "hash": digest,
+             "entries": compiled.entries}
+    try:
+        tmpfile = cacheFile(path) + ".tmp"
+        with open(tmpfile, "wb") as f: pickle.dump(cache, f)
+        os.replace(tmpfile, cacheFile(path))
+    except OSError as e:
+        print("Could not cache schedule: %s" %e)
+    return compiled
+
 def writeSchedule(file, schedule):
     with open(file,"w") as f:
         for behavior in sorted(schedule):
@@ -70,4 +346,28 @@ def displaySchedule(schedule):
 
     plt.tight_layout()
     plt.ion()
-    plt.show()
\ No newline at end of file
+    plt.show()
+
+# Check (and compile) schedules before deploying them, and report any
+#  actuator conflicts:
+#   python schedule.py <schedule file> ...
+if __name__ == '__main__':
+    status = 0
+    for file in sys.argv[1:]:
+        try:
+            compiled = loadSchedule(file)
+            compiled.check_names(behavior_actuators, file)
+            schedule, timeline = compiled.daySchedule(time.time())
+            print("%s: OK (%d behaviors, %d transitions today)"
+                  %(file, len(compiled.behaviors()), len(timeline[0])))
+        except Exception as e:
+            print("%s: %s" %(file, e))
+            status = 1
+            continue
+        for date, (schedule, timeline) in compiled.variants():
+            report = conflictReport(*findConflicts(timeline))
+            if (not report): continue
+            print("  Conflicts on %s%s:" %(date.strftime("%a ") if compiled.weekly
+                                           else "", date))
+            for line in report: print("    %s" %line)
+    sys.exit(status)
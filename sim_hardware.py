@@ -0,0 +1,197 @@
+'''
+ROS-free stand-in for the TerraBot hardware.
+A simple lumped model of the greenhouse (light, temperature, humidity, soil
+moisture, weight and reservoir level) is driven by the fan, pump and LED
+state.  It runs on a virtual clock that only advances when the agent spins,
+so simulating a week takes only as long as the agent's own computation.
+SimSensors and SimActuators implement the same interfaces (and the same
+doSense readings) as ROSSensors and ROSActuators.
+'''
+from hardware import *
+import time, datetime, math
+from bisect import bisect_right
+
+def time_since_midnight(unix_time):
+    dt = datetime.datetime.fromtimestamp(unix_time)
+    midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    return (dt - midnight).total_seconds()
+
+class VirtualClock:
+    def __init__(self, start=None, duration=None):
+        self.time = time.time() if start is None else start
+        self.end = None if duration is None else self.time + duration
+        self.listeners = [] # Called with the time step whenever time advances
+
+    def now(self):
+        return self.time
+
+    def running(self):
+        return self.end is None or self.time < self.end
+
+    def advance(self, dt):
+        for listener in self.listeners:
+            listener(dt)
+        self.time += dt
+
+class Greenhouse:
+    # Light sensor increase for each unit of LED power
+    LED_GAIN = 2.5
+    # Air temperature and humidity relax towards the outside air, faster when
+    #  the fan is on (time constants, in seconds)
+    AIR_TAU = 3600
+    FAN_TAU = 600
+    # Heating from the LEDs at full power, degrees per second
+    LED_HEAT = 5e-4
+    # Outside temperature varies daily around the mean, peaking at 3pm
+    OUTSIDE_TEMP = 21
+    OUTSIDE_TEMP_SWING = 3
+    OUTSIDE_HUMID = 50
+    # Humidity added by evaporation from the soil, per second, at SOIL_FULL
+    EVAP_HUMID = 0.005
+    # Fraction of the soil water evaporating per second (doubled by the fan)
+    EVAP_RATE = 5e-6
+    SOIL_FULL = 150 # ml
+    # Soil moisture sensor reading, as a function of the water in the soil
+    SMOIST_DRY = 250
+    SMOIST_PER_ML = 2
+    PUMP_RATE = 2 # ml/sec
+    PLANT_WEIGHT = 650 # grams, without the water in the soil
+    LEVEL_PER_ML = 0.05 # mm of reservoir level per ml of water
+    MAX_STEP = 10 # Longest time step used to integrate the model
+
+    def __init__(self, clock, ambient_file="grader_files/ambient.log",
+                 temperature=22, humidity=60, water=150, reservoir=3000):
+        self.clock = clock
+        self.temperature = temperature
+        self.humidity = humidity
+        self.water = water # ml of water in the soil
+        self.reservoir = reservoir # ml of water in the reservoir
+        self.fan = False
+        self.wpump = False
+        self.led = 0
+        self.sensors = []
+        self.read_ambient(ambient_file)
+        clock.listeners.append(self.advance)
+
+    # Ambient light over the day, as (seconds since midnight, light) pairs
+    def read_ambient(self, filename):
+        self.ambient_times, self.ambient_values = [0], [0]
+        try:
+            with open(filename) as ambient_file:
+                data = [line.split() for line in ambient_file if line.strip()]
+            self.ambient_times = [float(d[0]) for d in data]
+            self.ambient_values = [float(d[1]) for d in data]
+        except OSError:
+            print("No ambient light file %s; assuming darkness" %filename)
+
+    def ambient(self, mtime):
+        index = bisect_right(self.ambient_times, mtime) - 1
+        if (index < 0): return self.ambient_values[0]
+        if (index >= len(self.ambient_times) - 1): return self.ambient_values[-1]
+        t1, t2 = self.ambient_times[index], self.ambient_times[index+1]
+        v1, v2 = self.ambient_values[index], self.ambient_values[index+1]
+        return v1 + (v2 - v1)*(mtime - t1)/(t2 - t1)
+
+    def outside_temp(self, mtime):
+        return (self.OUTSIDE_TEMP + self.OUTSIDE_TEMP_SWING*
+                math.sin(2*math.pi*(mtime - 9*3600)/86400))
+
+    def setActuator(self, actuator, value):
+        if (actuator in ("fan", "wpump", "led")):
+            setattr(self, actuator, value)
+
+    def advance(self, dt):
+        now = self.clock.now()
+        while (dt > 0):
+            step = min(dt, self.MAX_STEP)
+            self.step(step, time_since_midnight(now))
+            now += step
+            dt -= step
+        for sensors in self.sensors:
+            sensors.update(now)
+
+    def step(self, dt, mtime):
+        tau = self.FAN_TAU if self.fan else self.AIR_TAU
+        self.temperature += dt*((self.outside_temp(mtime) - self.temperature)/tau
+                                + self.LED_HEAT*self.led/255.0)
+        self.humidity += dt*((self.OUTSIDE_HUMID - self.humidity)/tau +
+                             self.EVAP_HUMID*self.water/self.SOIL_FULL)
+        self.humidity = max(0, min(100, self.humidity))
+        evaporation = self.EVAP_RATE*(2 if self.fan else 1)*self.water*dt
+        self.water = max(0, self.water - evaporation)
+        if (self.wpump):
+            pumped = min(self.reservoir, self.PUMP_RATE*dt)
+            self.reservoir -= pumped
+            self.water += pumped
+
+    # Sensor readings
+    def light(self, mtime):
+        return self.ambient(mtime) + self.LED_GAIN*self.led
+
+    def smoist(self):
+        return self.SMOIST_DRY + self.SMOIST_PER_ML*self.water
+
+    def weight(self):
+        return self.PLANT_WEIGHT + self.water
+
+    def level(self):
+        return self.LEVEL_PER_ML*self.reservoir
+
+class SimSensors(Sensors):
+
+    light_level = 0
+    temperature = 0
+    humidity = 0
+    weight = 0
+    moisture = 0
+    wlevel = 0
+    # Set whenever the light, temperature, humidity or soil moisture reading
+    #  changes, as with ROSSensors
+    changed = False
+
+    def __init__(self, greenhouse):
+        self.greenhouse = greenhouse
+        greenhouse.sensors.append(self)
+        self.update(self.getTime())
+
+    def getTime(self):
+        return self.greenhouse.clock.now()
+
+    def setReading(self, attr, value):
+        if (value != getattr(self, attr)): self.changed = True
+        setattr(self, attr, value)
+
+    # Like the real sensors, report whole numbers for light, temperature,
+    #  humidity and soil moisture
+    def update(self, now):
+        greenhouse = self.greenhouse
+        self.setReading('light_level',
+                        float(round(greenhouse.light(time_since_midnight(now)))))
+        self.setReading('temperature', float(round(greenhouse.temperature)))
+        self.setReading('humidity', float(round(greenhouse.humidity)))
+        self.setReading('moisture', float(round(greenhouse.smoist())))
+        self.weight = greenhouse.weight()
+        self.wlevel = greenhouse.level()
+
+    def doSense(self):
+        now = self.getTime()
+        return SensorData(now, time_since_midnight(now), self.light_level,
+                          self.temperature, self.humidity, self.weight,
+                          self.moisture, self.wlevel, [self.light_level]*2,
+                          [self.temperature]*2, [self.humidity]*2,
+                          [self.weight/2]*2, [self.moisture]*2, self.wlevel)
+
+class SimActuators(Actuators):
+
+    def __init__(self, greenhouse, coalesce=False):
+        self.greenhouse = greenhouse
+        self.coalesce = coalesce
+        self.actuator_state = {"fan": False, "wpump": False, "led": 0, "camera": ""}
+
+    def doActions(self, actions_tuple):
+        for action, value in actions_tuple[2].items():
+            self.command(action, value)
+
+    def send(self, actuator, value):
+        self.actuator_state[actuator] = value
+        self.greenhouse.setActuator(actuator, value)
@@ -0,0 +1,131 @@
+'''
+Declarative two-threshold (hysteresis) behaviors.
+RaiseTempBehavior, LowerTempBehavior, LowerHumidBehavior and
+LowerMoistBehavior are all the same FSM: once enabled (Init, which turns
+the actuator off), the actuator is turned on when the sensor crosses the
+"on" threshold, and off again when it comes back past the "off" threshold.
+Here each is just a row of SPECS, and all the rules of a ThresholdBank are
+evaluated together, as NumPy array comparisons, in one pass per step of
+the behavioral layer.
+Each rule still has a ThresholdBehavior, which the layers enable, disable
+and step like any other behavior (publishing on the enable and disable
+topics as usual); the first of them stepped with a sensor reading steps
+the whole bank, and the rest do nothing.
+'''
+from behavior import *
+from limits import *
+from collections import namedtuple
+import numpy as np
+import log_channels
+
+# sign is +1 if the actuator turns on when the sensor is at or above the on
+#  threshold (and off at or below the off threshold), and -1 if it turns on
+#  at or below the on threshold (and off at or above the off threshold)
+ThresholdSpec = namedtuple("ThresholdSpec", ["name", "sensor", "sign", "on", "off",
+                                             "actuator", "on_value", "off_value",
+                                             "on_state", "off_state"])
+
+SPECS = [
+    ThresholdSpec("RaiseTempBehavior", "temp", -1, limits['temperature'][0],
+                  optimal['temperature'][0], "led", 200, 0, "Low", "Perfect"),
+    ThresholdSpec("LowerTempBehavior", "temp", 1, limits['temperature'][1],
+                  optimal['temperature'][1], "fan", True, False, "High", "Perfect"),
+    ThresholdSpec("LowerHumidBehavior", "humid", 1, limits['humidity'][1],
+                  optimal['humidity'][1], "fan", True, False, "Humid", "Perfect"),
+    ThresholdSpec("LowerMoistBehavior", "smoist", 1, limits['moisture'][1],
+                  optimal['moisture'][1], "fan", True, False, "Moist", "Perfect"),
+]
+
+# Rule states
+HALT, INIT, OFF, ON = range(4)
+
+class ThresholdBank:
+    def __init__(self, specs, agent=None):
+        self.specs = specs
+        self.sensors = sorted(set(spec.sensor for spec in specs))
+        self.sensor_index = np.array([self.sensors.index(spec.sensor) for spec in specs])
+        self.sign = np.array([spec.sign for spec in specs], dtype=float)
+        self.on = self.sign*np.array([spec.on for spec in specs], dtype=float)
+        self.off = self.sign*np.array([spec.off for spec in specs], dtype=float)
+        self.state = np.full(len(specs), HALT)
+        self.behaviors = [ThresholdBehavior(agent, self, i) for i in range(len(specs))]
+        self.stepped = None # Sensor data of the last step
+        # Rule name -> {"trigger:source->dest": count}, as profiler counts
+        #  the triggers of the other behaviors (but doStep only when it
+        #  changes the state)
+        self.transitions = {spec.name: {} for spec in specs}
+
+    def stateName(self, i):
+        return ["Halt", "Init", self.specs[i].off_state, self.specs[i].on_state][self.state[i]]
+
+    def count(self, i, trigger, source):
+        counts = self.transitions[self.specs[i].name]
+        key = "%s:%s->%s" %(trigger, source, self.stateName(i))
+        counts[key] = counts.get(key, 0) + 1
+
+    def command(self, i, on, actuators, sensors):
+        spec = self.specs[i]
+        actuators.doActions((spec.name, sensors.getTime(),
+                             {spec.actuator: spec.on_value if on else spec.off_value}))
+
+    def enable(self, i, actuators, sensors):
+        source = self.stateName(i)
+        if (self.state[i] == HALT):
+            self.state[i] = INIT
+            self.command(i, False, actuators, sensors)
+        self.count(i, "enable", source)
+
+    def disable(self, i, actuators, sensors):
+        source = self.stateName(i)
+        self.state[i] = HALT
+        self.command(i, False, actuators, sensors)
+        self.count(i, "disable", source)
+
+    # Step all the enabled rules, once per sensor reading, however many of
+    #  the behaviors are stepped with it
+    def step(self, sensordata, actuators, sensors):
+        if (self.stepped is sensordata): return
+        self.stepped = sensordata
+        values = self.sign*np.array([sensordata[sensor] for sensor in self.sensors],
+                                    dtype=float)[self.sensor_index]
+        state = self.state
+        on = (values >= self.on) & ((state == INIT) | (state == OFF))
+        off = (values <= self.off) & ((state == INIT) | (state == ON)) & ~on
+        if (not (on.any() or off.any())): return
+        for i in np.flatnonzero(on | off):
+            source = self.stateName(i)
+            if (on[i]): self.command(i, True, actuators, sensors)
+            elif (state[i] == ON): self.command(i, False, actuators, sensors)
+            state[i] = ON if on[i] else OFF
+            self.count(i, "doStep", source)
+            log_channels.fsm_event(sensordata.unix_time, self.specs[i].name,
+                                   "doStep", source, self.stateName(i))
+
+class ThresholdBehavior(Behavior):
+    def __init__(self, agent, bank, index):
+        spec = bank.specs[index]
+        super(ThresholdBehavior, self).__init__(agent, spec.name)
+        self.bank = bank
+        self.index = index
+        self.inputs = (spec.sensor,)
+
+    @property
+    def state(self):
+        return self.bank.stateName(self.index)
+
+    def enable(self):
+        self.bank.enable(self.index, self.actuators, self.sensors)
+
+    def disable(self):
+        self.bank.disable(self.index, self.actuators, self.sensors)
+
+    def doStep(self, sensordata=None):
+        self.sensordata = sensordata or self.sensors.doSense()
+        self.bank.step(self.sensordata, self.actuators, self.sensors)
+
+    def nextDeadline(self):
+        return None # Only reacts to sensor changes
+
+# The threshold behaviors (sharing one bank), in the order of SPECS
+def makeBehaviors(agent, specs=SPECS):
+    return ThresholdBank(specs, agent).behaviors